@@ -0,0 +1,56 @@
+"""
+    micro-benchmark: python bits_utils vs numpy bits_utils
+
+    usage: python bench_bits_utils.py [num_tiles]
+"""
+import sys
+import timeit
+
+import numpy as np
+from bits_utils import bit_depth_scale, byte_array_to_bit_array, \
+                       np_bit_depth_scale, np_byte_array_to_bit_array
+
+
+def decode_py(tiles, bit_depth, num_pixels):
+    ret = []
+    for tile in tiles:
+        data = byte_array_to_bit_array(tile, bit_depth)[:num_pixels]
+        ret.append([ bit_depth_scale(val, bit_depth, 8) for val in data ])
+    return ret
+
+def decode_np(tiles, bit_depth, num_pixels):
+    ret = []
+    for tile in tiles:
+        data = np_byte_array_to_bit_array(tile, bit_depth, count=num_pixels)
+        ret.append(np_bit_depth_scale(data, bit_depth, 8))
+    return ret
+
+def decode_np_batched(tiles, bit_depth, num_pixels):
+    data = np.frombuffer(b"".join(tiles), dtype=np.uint8).reshape(len(tiles), -1)
+    data = np_byte_array_to_bit_array(data, bit_depth, count=num_pixels)
+    return np_bit_depth_scale(data, bit_depth, 8)
+
+def main(num_tiles=2000, width=12, height=12):
+    rng = np.random.default_rng(0)
+    print("{} tiles of {}x{}".format(num_tiles, width, height))
+    for bit_depth in [1, 2, 3, 4, 8]:
+        num_pixels = width * height
+        tile_bytes_size = (num_pixels * bit_depth + 7) // 8
+        tiles = [ rng.integers(0, 256, tile_bytes_size, dtype=np.uint8).tobytes()
+                  for _ in range(num_tiles) ]
+
+        expected = np.asarray(decode_py(tiles, bit_depth, num_pixels), dtype=np.uint8)
+        assert(np.array_equal(expected, np.asarray(decode_np(tiles, bit_depth, num_pixels))))
+        assert(np.array_equal(expected, decode_np_batched(tiles, bit_depth, num_pixels)))
+
+        for name, func in [("python", decode_py),
+                           ("numpy", decode_np),
+                           ("numpy batched", decode_np_batched)]:
+            number = 1 if name == "python" else 10
+            t = min(timeit.repeat(lambda: func(tiles, bit_depth, num_pixels),
+                                  number=number, repeat=3)) / number
+            print("  {}bpp {:>14}: {:9.3f} ms  {:12.0f} glyphs/s".format(
+                bit_depth, name, t * 1000, num_tiles / t))
+
+if __name__ == "__main__":
+    main(*[ int(arg) for arg in sys.argv[1:2] ])
@@ -0,0 +1,50 @@
+"""
+    benchmark: cold import time of the modules, each imported in a fresh
+    interpreter; also checks that the parsing path does not load the
+    display / rasterization backends (cv2, PIL)
+
+    usage: python bench_import.py [repeat]
+"""
+import os
+import subprocess
+import sys
+
+MODULES = ["bits_utils", "bit_image", "nftr", "char_font", "text_renderer"]
+# must not be loaded by importing these
+HEAVY = ["cv2", "PIL"]
+
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, *[ name for name in {heavy!r} if name in sys.modules ])
+"""
+
+def cold_import(module, repeat=5):
+    """
+        return: (best time in seconds, heavy modules loaded by the import)
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    best, loaded = float("inf"), []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", SCRIPT.format(module=module, heavy=HEAVY)],
+                             cwd=here, capture_output=True, text=True, check=True).stdout.split()
+        best = min(best, float(out[0]))
+        loaded = out[1:]
+    return best, loaded
+
+def main(repeat=5):
+    # numpy alone is the floor of every module here
+    floor, _ = cold_import("numpy", repeat)
+    print("  {:<14} {:8.1f} ms".format("numpy", floor * 1000))
+    for module in MODULES:
+        t, loaded = cold_import(module, repeat)
+        line = "  {:<14} {:8.1f} ms  (+{:.1f} ms over numpy)".format(
+                    module, t * 1000, (t - floor) * 1000)
+        if loaded:
+            line += "  loads " + ", ".join(loaded)
+        print(line)
+
+if __name__ == "__main__":
+    main(*[ int(arg) for arg in sys.argv[1:2] ])
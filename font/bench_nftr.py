@@ -0,0 +1,164 @@
+"""
+    benchmark: NFTR parsing, glyph decoding, lookups and CharFont rasterization
+    on synthetic fonts generated offline
+
+    usage: python bench_nftr.py [--tiles N] [--size WxH] [--bpp 1 2 3]
+                                [--cmap 0 1 2] [--ttf font.ttf]
+                                [--baseline bench.json] [--save-baseline bench.json]
+
+    exits with 1 if a case is slower than the baseline by more than --tolerance
+"""
+import argparse
+import json
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+from nftr import NFTR, WIDTH_DTYPE
+from nftr_writer import serialize_nftr
+
+
+def synthetic_nftr(num_of_tiles=2000, tile_width=12, tile_height=12, bit_depth=2,
+                   map_type=0, seed=0):
+    """
+        NFTR file of random tiles and widths, every tile is mapped to one
+        character by a single CMAP of map_type (0: a range of consecutive
+        tiles, 1: a range of shuffled tiles, 2: scattered characters)
+        return: (bytearray, characters)
+    """
+    assert(num_of_tiles <= 0xFFFF - 0x20)
+    rng = np.random.default_rng(seed)
+    tile_bytes_size = (tile_width * tile_height * bit_depth + 7) // 8
+    tiles = rng.integers(0, 256, num_of_tiles * tile_bytes_size, dtype=np.uint8)
+
+    widths = np.zeros(num_of_tiles, dtype=WIDTH_DTYPE)
+    widths["left"] = rng.integers(0, 2, num_of_tiles)
+    widths["glyph_width"] = rng.integers(1, tile_width + 1, num_of_tiles)
+    widths["advance"] = widths["glyph_width"] + 1
+
+    # CJK block, or as close to it as the tiles fit in the BMP
+    first = min(0x4E00, 0x10000 - num_of_tiles)
+    if map_type == 0:
+        charas = np.arange(first, first + num_of_tiles)
+        cmaps = [(0, first, first + num_of_tiles - 1, 0)]
+    elif map_type == 1:
+        charas = np.arange(first, first + num_of_tiles)
+        cmaps = [(1, first, first + num_of_tiles - 1, rng.permutation(num_of_tiles))]
+    else:
+        charas = np.sort(rng.choice(np.arange(0x20, 0xFFFF), num_of_tiles, replace=False))
+        cmaps = [(2, 0, 0xFFFF, np.stack([charas, rng.permutation(num_of_tiles)], axis=1))]
+
+    data = serialize_nftr(tiles, widths, None, None, tile_width, tile_height, bit_depth,
+                          tile_bytes_size=tile_bytes_size, cmaps=cmaps)
+    return data, charas
+
+def bench_parse(data, charas, ttf):
+    """ chunk headers and tables only (lazy=True) """
+    NFTR(data, lazy=True).close()
+
+def bench_decode(data, charas, ttf):
+    """ every glyph decoded """
+    NFTR(data).glyph_images
+
+def bench_lookup(data, charas, ttf, font_cache={}):
+    """ find_character_glyph of every character (font parsed once) """
+    if font_cache.get("data") is not data:
+        font_cache["data"] = data
+        font_cache["nftr"] = NFTR(data)
+    nftr = font_cache["nftr"]
+    for chara in charas.tolist():
+        nftr.find_character_glyph(chara)
+
+def bench_rasterize(data, charas, ttf, font_cache={}):
+    """ CharFont.char_images of every character """
+    from char_font import CharFont
+    if ttf not in font_cache:
+        font_cache[ttf] = CharFont(ttf, 12)
+    font_cache[ttf].char_images([ chr(c) for c in charas.tolist() ])
+
+BENCHMARKS = [
+    ("parse", bench_parse),
+    ("decode", bench_decode),
+    ("lookup", bench_lookup),
+    ("rasterize", bench_rasterize),
+]
+
+def measure(func, data, charas, ttf, repeat=3):
+    """
+        return: (best time in seconds, peak traced memory in bytes)
+    """
+    func(data, charas, ttf)  # warm up (imports, caches)
+    t = min(timeit.repeat(lambda: func(data, charas, ttf), number=1, repeat=repeat))
+    tracemalloc.start()
+    func(data, charas, ttf)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return t, peak
+
+def run(num_of_tiles=2000, tile_size=(12, 12), bit_depths=(1, 2, 3), map_types=(0, 1, 2),
+        ttf=None, baseline=None, tolerance=0.2):
+    """
+        return: ({case: glyphs/s}, [regressed case]),
+                case is e.g. "12x12 2bpp cmap1 decode"
+        baseline: {case: glyphs/s} of an earlier run, cases slower by more
+                  than tolerance are regressions
+    """
+    results = {}
+    regressions = []
+    print("{} tiles of {}x{}".format(num_of_tiles, *tile_size))
+    for bit_depth in bit_depths:
+        for map_type in map_types:
+            data, charas = synthetic_nftr(num_of_tiles, tile_size[0], tile_size[1],
+                                          bit_depth, map_type)
+            data = bytes(data)
+            for name, func in BENCHMARKS:
+                if name == "rasterize" and (ttf is None or bit_depth != bit_depths[0]
+                                            or map_type != map_types[0]):
+                    # needs a TTF, and does not depend on the NFTR
+                    continue
+                case = "{}x{} {}bpp cmap{} {}".format(tile_size[0], tile_size[1],
+                                                      bit_depth, map_type, name)
+                t, peak = measure(func, data, charas, ttf)
+                results[case] = len(charas) / t
+
+                line = "  {:<28} {:9.3f} ms {:12.0f} glyphs/s {:8.2f} MiB peak".format(
+                            case, t * 1000, results[case], peak / 2**20)
+                if baseline and case in baseline:
+                    ratio = results[case] / baseline[case]
+                    line += "  {:+6.1f}% vs baseline".format((ratio - 1) * 100)
+                    if ratio < 1 - tolerance:
+                        line += "  REGRESSION"
+                        regressions.append(case)
+                print(line)
+    return results, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="NFTR benchmarks on synthetic fonts")
+    parser.add_argument("--tiles", type=int, default=2000)
+    parser.add_argument("--size", default="12x12", help="tile size, WxH")
+    parser.add_argument("--bpp", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--cmap", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--ttf", help="TTF for the CharFont benchmark (skipped without)")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--save-baseline", help="write the results as JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+    tile_size = tuple(int(v) for v in args.size.lower().split("x"))
+
+    results, regressions = run(args.tiles, tile_size, args.bpp, args.cmap, args.ttf,
+                               baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+    # non-zero exit status for CI
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,36 +1,124 @@
-import cv2
-import numpy as np
-from bits_utils import bit_depth_scale, byte_array_to_bit_array
-
-class BitImage:
-
-    GRAY_CHANNELS = 8
-
-    def __init__(self, image, width=12, height=12, bit_depth=2):
-        """
-            image: bytes | numpy str (to be converted to bytes)
-            width, height: in pixels
-        """
-        self.width = width 
-        self.height = height
-        self.bit_depth = bit_depth
-        if isinstance(image, bytes):
-            self.data_in_bytes = image
-            data = byte_array_to_bit_array(image, bit_depth)
-            data = self.array_truncate(data)
-            # performance issue?
-            data = [ bit_depth_scale(val, bit_depth, self.GRAY_CHANNELS) for val in data ]
-            self.data = np.asarray(data, dtype=np.uint8).reshape(width, height)
-        elif isinstance(image, np.array) or isinstance(str, np.array):
-            self.data = image
-
-    def array_truncate(self, val_array):
-        supposed_array_length = self.width * self.height
-        assert(len(val_array) >= supposed_array_length)
-        return val_array[:supposed_array_length]
-        
-
-    def show(self, width=512, height=512):
-        resized_image = cv2.resize(self.data, (width, height), interpolation=cv2.INTER_NEAREST)
-        cv2.imshow("bits image", resized_image)
-        cv2.waitKey(0)
+import numpy as np
+from collections.abc import Sequence
+from bits_utils import np_bit_depth_scale, np_byte_array_to_bit_array
+
+class BitImage:
+
+    GRAY_CHANNELS = 8
+
+    def __init__(self, image, width=12, height=12, bit_depth=2):
+        """
+            image: bytes | numpy str (to be converted to bytes)
+            width, height: in pixels
+        """
+        self.width = width 
+        self.height = height
+        self.bit_depth = bit_depth
+        if isinstance(image, bytes):
+            self.data_in_bytes = image
+            data = np_byte_array_to_bit_array(image, bit_depth)
+            data = self.array_truncate(data)
+            data = np_bit_depth_scale(data, bit_depth, self.GRAY_CHANNELS)
+            self.data = data.reshape(height, width)
+        elif isinstance(image, np.ndarray):
+            self.data_in_bytes = None
+            self.data = image
+
+    def array_truncate(self, val_array):
+        supposed_array_length = self.width * self.height
+        assert(len(val_array) >= supposed_array_length)
+        return val_array[:supposed_array_length]
+        
+
+    def show(self, width=512, height=512):
+        """
+            one image in a window (blocks until a key is pressed),
+            see glyph_atlas to look at all the glyphs of a font at once
+        """
+        # OpenCV is only loaded to display images
+        import cv2
+        resized_image = cv2.resize(self.data, (width, height), interpolation=cv2.INTER_NEAREST)
+        cv2.imshow("bits image", resized_image)
+        cv2.waitKey(0)
+
+
+def decode_bit_images(data, num_of_images, width, height, bit_depth,
+                      image_bytes_size=-1, gray_channels=BitImage.GRAY_CHANNELS):
+    """
+        decode a run of packed images (e.g. the tiles of a CGLP chunk) at once
+        data: bytes-like, num_of_images * image_bytes_size bytes at least
+        image_bytes_size: bytes per image, -1 for (width*height*bit_depth+7)//8
+        return: uint8 numpy array of shape (num_of_images, height, width)
+    """
+    if image_bytes_size == -1:
+        image_bytes_size = (width * height * bit_depth + 7) // 8
+    packed = np.frombuffer(data, dtype=np.uint8, count=num_of_images * image_bytes_size)
+    packed = packed.reshape(num_of_images, image_bytes_size)
+
+    vals = np_byte_array_to_bit_array(packed, bit_depth, count=width * height)
+    vals = np_bit_depth_scale(vals, bit_depth, gray_channels)
+    return vals.reshape(num_of_images, height, width)
+
+class BitImageList(Sequence):
+    """
+        read-only list of BitImage backed by one (N, H, W) array,
+        every BitImage is a view created when it is accessed
+    """
+    def __init__(self, images, bit_depth=2):
+        self.images = images
+        self.bit_depth = bit_depth
+
+    def __len__(self):
+        return self.images.shape[0]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return BitImageList(self.images[idx], self.bit_depth)
+        image = self.images[idx]
+        return BitImage(image, image.shape[1], image.shape[0], self.bit_depth)
+
+class LazyBitImageList(Sequence):
+    """
+        read-only list of BitImage over packed image bytes (e.g. a mmap),
+        an image is decoded the first time it is accessed, then cached
+    """
+    def __init__(self, data, num_of_images, width, height, bit_depth,
+                 image_bytes_size=-1):
+        if image_bytes_size == -1:
+            image_bytes_size = (width * height * bit_depth + 7) // 8
+        # memoryview, so slicing does not copy
+        self.data = memoryview(data)
+        self.num_of_images = num_of_images
+        self.width = width
+        self.height = height
+        self.bit_depth = bit_depth
+        self.image_bytes_size = image_bytes_size
+        self.decoded = {}
+
+    def __len__(self):
+        return self.num_of_images
+
+    def release(self):
+        """
+            release the view of the packed bytes (e.g. before the mmap it
+            points to is closed), images not decoded yet can no longer be
+        """
+        self.data.release()
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [ self[i] for i in range(*idx.indices(len(self))) ]
+        if idx < 0:
+            idx += self.num_of_images
+        if not (0 <= idx < self.num_of_images):
+            raise IndexError("image index out of range")
+
+        if idx not in self.decoded:
+            start = idx * self.image_bytes_size
+            image = decode_bit_images(
+                        self.data[start:start + self.image_bytes_size],
+                        1, self.width, self.height, self.bit_depth,
+                        self.image_bytes_size
+                    )[0]
+            self.decoded[idx] = BitImage(image, self.width, self.height, self.bit_depth)
+        return self.decoded[idx]
@@ -1,6 +1,10 @@
+from functools import lru_cache
+
+import numpy as np
+
 def bit_depth_scale(in_val, in_bits: int, out_bits: int):
     """
-        int_bits: 2 or mutliple of 4
+        int_bits: 1, 2, 3 or mutliple of 4
         out_bits: should be multiple of 8 
 
         ???: 
@@ -15,6 +19,13 @@ def bit_depth_scale(in_val, in_bits: int, out_bits: int):
                    0100  0010 0000 -> 32
                    1000  1000 0000 -> 128
     """
+    if in_bits == 1:
+        return 255 if in_val else 0
+
+    if in_bits == 3:
+        # 0, 36, 73, 109, 146, 182, 219, 255
+        return (in_val * 255 + 3) // 7
+
     if in_bits == 2:
         if in_val == 0b00:
             return 0
@@ -72,6 +83,130 @@ def byte_array_to_bit_array(in_bytes, bit_depth, byte_order_flag="big"):
 def bytearray_to_bit_array(in_bytes, bit_depth, byte_order_flag="big"):
     return byte_array_to_bit_array(in_bytes, bit_depth, byte_order_flag)
 
+#############################################################
+# numpy (vectorized) versions of the functions above
+
+@lru_cache(maxsize=None)
+def bit_depth_scale_table(in_bits: int, out_bits: int = 8):
+    """
+        lookup table, table[val] == bit_depth_scale(val, in_bits, out_bits)
+        for every val in range [0, 2**in_bits)
+    """
+    dtype = np.uint8 if out_bits <= 8 else np.uint32
+    table = np.asarray(
+        [ bit_depth_scale(val, in_bits, out_bits) for val in range(1 << in_bits) ],
+        dtype=dtype
+    )
+    table.setflags(write=False)
+    return table
+
+def np_bit_depth_scale(val_array, in_bits: int, out_bits: int = 8):
+    """
+        same as [ bit_depth_scale(val, in_bits, out_bits) for val in val_array ],
+        val_array: numpy array of any shape
+    """
+    return bit_depth_scale_table(in_bits, out_bits)[val_array]
+
+def np_byte_array_to_bit_array(in_bytes, bit_depth, byte_order_flag="big", count=-1):
+    """
+        same as byte_array_to_bit_array, but returns a numpy uint8 array
+
+        in_bytes: bytes-like | numpy uint8 array of shape (..., n_bytes)
+            every row (last axis) is unpacked separately, so a batch of
+            tiles can be unpacked in one call: (N, n_bytes) -> (N, count)
+        bit_depth: 1 ~ 8
+            pixels are not required to be byte-aligned (e.g. 3bpp, or
+            scanlines of a 10 pixels wide 2bpp tile), the bitstream
+            is read MSB first, just like byte_array_to_bit_array
+        count: number of values kept for each row, -1 for all of them
+    """
+    assert(byte_order_flag in ["big"])
+    assert(1 <= bit_depth <= 8)
+
+    if isinstance(in_bytes, np.ndarray):
+        in_array = in_bytes.astype(np.uint8, copy=False)
+    else:
+        in_array = np.frombuffer(in_bytes, dtype=np.uint8)
+
+    lead_shape = in_array.shape[:-1]
+    n_bytes = in_array.shape[-1]
+    n_vals = (n_bytes * 8 - 1) // bit_depth + 1 if n_bytes else 0
+    if count == -1:
+        count = n_vals
+    assert(count <= n_vals)
+
+    if bit_depth == 8:
+        return in_array[..., :count]
+
+    bits = np.unpackbits(in_array, axis=-1)
+    # padding (the last value may not have enough bits)
+    pad_len = n_vals * bit_depth - n_bytes * 8
+    if pad_len:
+        pad_width = [(0, 0)] * len(lead_shape) + [(0, pad_len)]
+        bits = np.pad(bits, pad_width)
+
+    bits = bits.reshape(lead_shape + (n_vals, bit_depth))[..., :count, :]
+    if bit_depth == 1:
+        return bits[..., 0]
+
+    weights = (1 << np.arange(bit_depth - 1, -1, -1)).astype(np.uint8)
+    return (bits * weights).sum(axis=-1, dtype=np.uint8)
+
+@lru_cache(maxsize=None)
+def bit_depth_quantize_table(in_bits: int, out_bits: int = 8):
+    """
+        inverse of bit_depth_scale_table, table[val] is the in_bits value
+        whose scaled value is the nearest to val, for val in [0, 2**out_bits)
+        (so table[bit_depth_scale(v, in_bits, out_bits)] == v)
+    """
+    levels = bit_depth_scale_table(in_bits, out_bits).astype(np.int64)
+    vals = np.arange(1 << out_bits, dtype=np.int64)
+    # ties go to the lower value
+    table = np.abs(vals[:, None] - levels[None, :]).argmin(axis=1).astype(np.uint8)
+    table.setflags(write=False)
+    return table
+
+def np_bit_depth_quantize(val_array, in_bits: int, out_bits: int = 8):
+    """
+        out_bits values (e.g. 8 bits gray) -> in_bits values
+        val_array: numpy array of any shape, bool is treated as 0 / max
+    """
+    if val_array.dtype == bool:
+        return val_array.astype(np.uint8) * np.uint8((1 << in_bits) - 1)
+    return bit_depth_quantize_table(in_bits, out_bits)[val_array]
+
+def np_bit_array_to_byte_array(val_array, bit_depth, byte_order_flag="big", bytes_size=-1):
+    """
+        inverse of np_byte_array_to_bit_array
+
+        val_array: numpy array of shape (..., n), values in [0, 2**bit_depth)
+            every row (last axis) is packed separately, MSB first and without
+            aligning values or scanlines to bytes: (N, n) -> (N, bytes_size)
+        bytes_size: bytes per row, -1 for (n*bit_depth+7)//8, rows are zero padded
+    """
+    assert(byte_order_flag in ["big"])
+    assert(1 <= bit_depth <= 8)
+
+    val_array = np.asarray(val_array, dtype=np.uint8)
+    n_vals = val_array.shape[-1]
+    if bytes_size == -1:
+        bytes_size = (n_vals * bit_depth + 7) // 8
+    assert(bytes_size * 8 >= n_vals * bit_depth)
+
+    if bit_depth == 8:
+        packed = val_array
+    else:
+        shifts = np.arange(bit_depth - 1, -1, -1, dtype=np.uint8)
+        bits = (val_array[..., None] >> shifts) & 1
+        bits = bits.reshape(val_array.shape[:-1] + (n_vals * bit_depth,))
+        packed = np.packbits(bits, axis=-1)
+
+    pad_len = bytes_size - packed.shape[-1]
+    if pad_len:
+        pad_width = [(0, 0)] * (packed.ndim - 1) + [(0, pad_len)]
+        packed = np.pad(packed, pad_width)
+    return packed
+
 
 def bit_array_to_byte_array(bit_array, byte_order_flag="big"):
     # assert(byte_order_flag in ["little", "big"])
@@ -79,13 +214,13 @@ def bit_array_to_byte_array(bit_array, byte_order_flag="big"):
     # little endian not implemented yet
 
     # make a copy
-    bit_array = bit_array[:]
+    bit_array = list(bit_array)
 
     # padding
     while(len(bit_array) % 8 != 0):
         bit_array.append(0)
 
-    byte_array = byte_array
+    byte_array = []
     for i in range(0, len(bit_array), 8):
         val = 0
         for j in range(8):
@@ -96,7 +231,7 @@ def bit_array_to_byte_array(bit_array, byte_order_flag="big"):
 
 def bit_array_to_bytearray(bit_array, byte_order_flag="big"):
     ba = bytearray()
-    byte_array = bit_array_to_bytearray(bit_array, byte_order_flag)
+    byte_array = bit_array_to_byte_array(bit_array, byte_order_flag)
     for i in byte_array:
         ba.append(i)
 
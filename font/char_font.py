@@ -1,43 +1,169 @@
-from PIL import Image, ImageDraw, ImageFont
+import os
 from typing import Union
 import numpy as np
 
 class CharFont:
 
-    def __init__(self, cfont, size: int=12, 
+    def __init__(self, cfont, size: int=12,
                  top_left_pos: tuple=(0, 0)):
         self._font_meta = cfont
         self.top_left_pos = top_left_pos
         self.size = size
+        # size -> FreeTypeFont, the TTF is only opened and parsed once per size
+        self._fonts = {}
+        # (mode, canvas size) -> (Image, ImageDraw), reused between characters
+        self._canvases = {}
 
-    def char_image(self, 
+    def font(self, size: Union[int, None] = None):
+        if not size:
+            size = self.size
+        if size not in self._fonts:
+            # PIL is only loaded to rasterize
+            from PIL import ImageFont
+            self._fonts[size] = ImageFont.truetype(self._font_meta, size=size)
+        return self._fonts[size]
+
+    def canvas(self, mode: str, canvas_size: tuple):
+        """
+            blank (white) canvas and its ImageDraw, reused between calls
+        """
+        key = (mode, canvas_size)
+        if key not in self._canvases:
+            from PIL import Image, ImageDraw
+            canvas = Image.new(mode, canvas_size, color="white")
+            self._canvases[key] = (canvas, ImageDraw.Draw(canvas))
+        else:
+            canvas, draw = self._canvases[key]
+            draw.rectangle((0, 0, canvas_size[0], canvas_size[1]), fill="white")
+        return self._canvases[key]
+
+    def char_image(self,
                    chara: str,
-                   size: Union[int, None] = None,  # font size 
+                   size: Union[int, None] = None,  # font size
                    w: int = -1, h: int = -1,       # canvas size
                    top_left_pos:Union[tuple, None] = None,
-                   mode: str = "L"):
+                   mode: str = "L",
+                   ink: bool = False):
         """
-            @param: mode, 'L' (8 bits) or '1' (1 bits) 
+            @param: mode, 'L' (8 bits) or '1' (1 bits)
+            @param: ink, see char_images
             ref: https://pillow.readthedocs.io/en/stable/handbook/concepts.html#concept-modes
         """
+        return self.char_images([chara], size, w, h, top_left_pos, mode, ink)[0]
+
+    def char_images(self,
+                    charas,
+                    size: Union[int, None] = None,  # font size
+                    w: int = -1, h: int = -1,       # canvas size
+                    top_left_pos:Union[tuple, None] = None,
+                    mode: str = "L",
+                    ink: bool = False):
+        """
+            rasterize every character of charas with the same font and canvas
+            @param: charas, str or list of str (one character each)
+            @param: ink, False for black (0) text on a white (255 / True)
+                    canvas, True for the ink as 255 / True on a 0 / False
+                    background, the polarity of NFTR glyphs (input of
+                    image_utils.images_to_byte_array)
+            @return: numpy array of shape (len(charas), h, w),
+                     uint8 for mode 'L', bool for mode '1'
+        """
         assert(mode in ['L', '1'])
-                       
+
+        if not top_left_pos:
+            top_left_pos = self.top_left_pos
+        if not size:
+            size = self.size
+
         if w == -1 or h == -1:
             canvas_size = (size, size)
         else:
             canvas_size = (w, h)
 
-        if not top_left_pos:
-            top_left_pos = self.top_left_pos
+        font = self.font(size)
+        dtype = np.uint8 if mode == "L" else bool
+        images = np.empty((len(charas), canvas_size[1], canvas_size[0]), dtype=dtype)
+
+        for i, chara in enumerate(charas):
+            canvas, draw_char = self.canvas(mode, canvas_size)
+            draw_char.text(top_left_pos, chara, font=font, fill="black")
+            images[i] = np.asarray(canvas)
+
+        if ink:
+            np.invert(images, out=images)
+        return images
+
+    def char_images_parallel(self,
+                             charas,
+                             size: Union[int, None] = None,  # font size
+                             w: int = -1, h: int = -1,       # canvas size
+                             top_left_pos:Union[tuple, None] = None,
+                             mode: str = "L",
+                             ink: bool = False,
+                             max_workers: Union[int, None] = None,
+                             shard_size: int = -1):
+        """
+            same as char_images, but charas is split in shards rasterized by
+            a pool of processes, each with its own font; the shards are
+            written into a shared memory array, in the order of charas
+            @param: max_workers, number of processes (default: cpu count)
+            @param: shard_size, characters per task (default: ~4 tasks per process)
+        """
+        # the process pool is only loaded for parallel rasterization
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import shared_memory
+
+        assert(mode in ['L', '1'])
+        assert(isinstance(self._font_meta, (str, bytes, os.PathLike))), \
+            "the font must be a path to be opened by other processes"
+
         if not size:
             size = self.size
-        
-        font = ImageFont.truetype(self._font_meta, size=size)
-
-        canvas = Image.new(mode, canvas_size, color="white")
-        draw_char = ImageDraw.Draw(canvas)
-        draw_char.text(top_left_pos, chara, font=font, fill="black")
-        
-        # canvas.show()
-        return np.array(canvas)
-    
\ No newline at end of file
+        if w == -1 or h == -1:
+            w, h = size, size
+        if not max_workers:
+            max_workers = os.cpu_count() or 1
+        if shard_size == -1:
+            shard_size = max(1, -(-len(charas) // (max_workers * 4)))
+
+        dtype = np.dtype(np.uint8 if mode == "L" else bool)
+        shape = (len(charas), h, w)
+        nbytes = max(1, int(np.prod(shape)) * dtype.itemsize)
+
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers,
+                                     initializer=_init_worker,
+                                     initargs=(self._font_meta, self.size, self.top_left_pos)) as executor:
+                tasks = [ executor.submit(_rasterize_shard, shm.name, shape, dtype.str, start,
+                                          charas[start:start + shard_size],
+                                          size, w, h, top_left_pos, mode, ink)
+                          for start in range(0, len(charas), shard_size) ]
+                for task in tasks:
+                    task.result()
+
+            images = np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return images
+
+
+# CharFont of a worker process of CharFont.char_images_parallel
+_worker_font = None
+
+def _init_worker(cfont, size, top_left_pos):
+    global _worker_font
+    _worker_font = CharFont(cfont, size, top_left_pos)
+
+def _rasterize_shard(shm_name, shape, dtype, start, charas, size, w, h, top_left_pos, mode, ink):
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        images = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        images[start:start + len(charas)] = \
+            _worker_font.char_images(charas, size, w, h, top_left_pos, mode, ink)
+        del images
+    finally:
+        shm.close()
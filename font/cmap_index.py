@@ -0,0 +1,174 @@
+from bisect import bisect_left
+from collections.abc import Mapping
+
+import numpy as np
+
+from errors import NFTRFormatError
+
+# Map Type1 entry for "no tile assigned"
+NO_TILE = 0xFFFF
+
+
+class CMAPIndex(Mapping):
+    """
+        character -> (cmap_idx, tile_idx) index over a list of CMAP,
+        without expanding every character like a dict would:
+            type 0: (first, last, tile for first character)
+            type 1: (first, last, uint16 array of tiles)
+            type 2: (sorted uint16 array of characters, uint16 array of tiles)
+        later CMAPs take priority over earlier ones (same as a merged dict)
+    """
+    def __init__(self, cmaps):
+        # (map_type, first, last, payload, cmap_idx), in CMAP order
+        self.segments = []
+        for i in range(len(cmaps)):
+            cmap = cmaps[i]
+            if cmap.map_type == 0:
+                payload = cmap.tile_num_for_first_chara
+                first, last = cmap.first_character, cmap.last_character
+            elif cmap.map_type == 1:
+                payload = np.asarray(cmap.tile_nums, dtype=np.uint16)
+                first, last = cmap.first_character, cmap.last_character
+            elif cmap.map_type == 2:
+                charas = np.asarray(cmap.custom_charas, dtype=np.uint16)
+                tiles = np.asarray(cmap.custom_tiles, dtype=np.uint16)
+                order = np.argsort(charas, kind="stable")
+                charas, tiles = charas[order], tiles[order]
+                # python list for bisect, arrays for searchsorted
+                payload = (charas.tolist(), charas, tiles)
+                first = int(charas[0]) if len(charas) else 0
+                last = int(charas[-1]) if len(charas) else -1
+            else:
+                raise NFTRFormatError("unknown CMAP map type {}".format(cmap.map_type))
+            self.segments.append((cmap.map_type, first, last, payload, i))
+
+        self._characters = None
+
+    def remap_tiles(self, tile_map):
+        """
+            replace every tile_idx by tile_map[tile_idx] (e.g. after duplicate
+            tiles are merged); a type 0 range whose tiles are no longer
+            consecutive is turned into a type 1 table; a tile_idx past the end
+            of tile_map (a CMAP over more tiles than the CGLP has) becomes no
+            tile: NO_TILE in a type 1 table, dropped from a type 2 pair list
+        """
+        tile_map = np.asarray(tile_map)
+
+        def remap(tiles):
+            """ remapped uint16 tiles, NO_TILE for none or out of range """
+            tiles = np.asarray(tiles, dtype=np.int64)
+            valid = tiles < len(tile_map)
+            remapped = np.full(len(tiles), NO_TILE, dtype=np.uint16)
+            remapped[valid] = tile_map[tiles[valid]]
+            return remapped
+
+        segments = []
+        for map_type, first, last, payload, cmap_idx in self.segments:
+            if map_type == 0:
+                tiles = remap(np.arange(last - first + 1) + payload)
+                if len(tiles) and np.all(np.diff(tiles.astype(np.int64)) == 1) \
+                        and tiles[-1] != NO_TILE:
+                    payload = int(tiles[0])
+                else:
+                    map_type, payload = 1, tiles
+            elif map_type == 1:
+                assigned = payload != NO_TILE
+                tiles = payload.copy()
+                tiles[assigned] = remap(payload[assigned])
+                payload = tiles
+            else:
+                _, charas, tiles = payload
+                tiles = remap(tiles)
+                valid = tiles != NO_TILE
+                charas, tiles = charas[valid], tiles[valid]
+                payload = (charas.tolist(), charas, tiles)
+            segments.append((map_type, first, last, payload, cmap_idx))
+        self.segments = segments
+        self._characters = None
+
+    def lookup(self, chara):
+        """
+            return (cmap_idx, tile_idx), or None if chara has no tile
+            (or is not an int character code, like a key missing from a dict)
+        """
+        if not isinstance(chara, (int, np.integer)):
+            return None
+        for map_type, first, last, payload, cmap_idx in reversed(self.segments):
+            if not (first <= chara <= last):
+                continue
+            if map_type == 0:
+                return (cmap_idx, payload + chara - first)
+            elif map_type == 1:
+                tile_idx = int(payload[chara - first])
+                if tile_idx != NO_TILE:
+                    return (cmap_idx, tile_idx)
+            else:
+                charas_list, _, tiles = payload
+                pos = bisect_left(charas_list, chara)
+                if pos < len(charas_list) and charas_list[pos] == chara:
+                    return (cmap_idx, int(tiles[pos]))
+        return None
+
+    def lookup_many(self, charas):
+        """
+            charas: iterable of int | numpy int array, character codes of the
+                    CMAPs (str are converted to them by NFTR.find_character_tiles)
+            return: int32 numpy array of tile_idx (same shape), -1 if no tile
+        """
+        assert(not isinstance(charas, str)), "CMAPIndex keys are character codes, not str"
+        charas = np.asarray(charas, dtype=np.int64)
+
+        tile_idx = np.full(charas.shape, -1, dtype=np.int32)
+        for map_type, first, last, payload, _ in self.segments:
+            in_range = (charas >= first) & (charas <= last)
+            if map_type == 0:
+                tile_idx[in_range] = charas[in_range] - first + payload
+            elif map_type == 1:
+                found = payload[charas[in_range] - first]
+                where = np.flatnonzero(in_range)
+                assigned = found != NO_TILE
+                tile_idx.flat[where[assigned]] = found[assigned]
+            else:
+                _, charas_array, tiles = payload
+                if not len(charas_array):
+                    continue
+                pos = np.searchsorted(charas_array, charas)
+                pos[pos == len(charas_array)] = 0
+                found = in_range & (charas_array[pos] == charas)
+                tile_idx[found] = tiles[pos[found]]
+        return tile_idx
+
+    def characters(self):
+        """
+            all characters with a tile, sorted uint16 numpy array
+        """
+        if self._characters is None:
+            candidates = []
+            for map_type, first, last, payload, _ in self.segments:
+                if map_type == 2:
+                    candidates.append(payload[1])
+                else:
+                    candidates.append(np.arange(first, last + 1))
+            if candidates:
+                candidates = np.unique(np.concatenate(candidates))
+                candidates = candidates[self.lookup_many(candidates) != -1]
+            else:
+                candidates = np.zeros(0)
+            self._characters = candidates.astype(np.uint16)
+        return self._characters
+
+    # Mapping interface (drop-in for the old merged dict)
+    def __getitem__(self, chara):
+        ret = self.lookup(chara)
+        if ret is None:
+            raise KeyError(chara)
+        return ret
+
+    def __contains__(self, chara):
+        return self.lookup(chara) is not None
+
+    def __iter__(self):
+        return iter(self.characters().tolist())
+
+    def __len__(self):
+        return len(self.characters())
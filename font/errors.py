@@ -0,0 +1,13 @@
+class NFTRFormatError(Exception):
+    """
+        the data is not a valid NFTR (bad signature, chunk size, ...)
+    """
+    pass
+
+class CharacterNotFoundError(Exception):
+    """
+        the character has no tile in the NFTR
+    """
+    def __init__(self, chara):
+        super().__init__("character not in NFTR: {!r}".format(chara))
+        self.chara = chara
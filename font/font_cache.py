@@ -0,0 +1,101 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+
+class FontCache:
+    """
+        on-disk cache of decoded glyph images (NFTR.glyph_images)
+
+        one .npy file per font, named by the hash of the NFTR file content
+        and the parser version, so a warm load is a single
+        np.load(mmap_mode='r'); the least recently used files are removed
+        once the cache grows over max_size bytes
+
+        usage:
+            cache = FontCache("~/.cache/rext")
+            font = NFTR("font.NFTR", cache=cache)
+    """
+    SUFFIX = ".npy"
+
+    def __init__(self, cache_dir, max_size: int = 512 * 1024 * 1024):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, data, version):
+        """
+            data: bytes-like, content of the NFTR file
+            version: parser version, part of the key so that
+                     entries written by another decoder are not used
+        """
+        return "{}-v{}".format(hashlib.sha256(data).hexdigest(), version)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + FontCache.SUFFIX)
+
+    def load(self, key):
+        """
+            return the cached array (read-only, memory-mapped), or None
+        """
+        path = self.path(key)
+        try:
+            images = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        # mark as recently used
+        os.utime(path)
+        return images
+
+    def store(self, key, images):
+        # write to a temporary file first, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                np.save(fp, np.ascontiguousarray(images))
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        """
+            [(mtime, size, path)] of every cached file, least recently used first
+        """
+        ret = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(FontCache.SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            ret.append((st.st_mtime, st.st_size, path))
+        return sorted(ret)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_size: int = -1):
+        """
+            remove least recently used files until the cache fits in max_size
+        """
+        if max_size == -1:
+            max_size = self.max_size
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        self.evict(0)
@@ -0,0 +1,129 @@
+import numpy as np
+
+from nftr import WIDTH_DTYPE
+
+
+class FontDiff:
+    """
+        what changed from one NFTR to another, by codepoint
+
+        added, removed: codepoints only mapped in the new / old font
+        changed_glyphs: codepoints in both fonts whose glyph is different
+        pixel_deltas: number of different pixels of every changed glyph
+        changed_widths: codepoints in both fonts whose CWDH entry is different
+        old_widths, new_widths: WIDTH_DTYPE entries of changed_widths
+    """
+    def __init__(self, added, removed, changed_glyphs, pixel_deltas,
+                 changed_widths, old_widths, new_widths):
+        self.added = added
+        self.removed = removed
+        self.changed_glyphs = changed_glyphs
+        self.pixel_deltas = pixel_deltas
+        self.changed_widths = changed_widths
+        self.old_widths = old_widths
+        self.new_widths = new_widths
+
+    def __bool__(self):
+        return bool(len(self.added) or len(self.removed)
+                    or len(self.changed_glyphs) or len(self.changed_widths))
+
+    def __str__(self):
+        return "{} added, {} removed, {} glyphs changed ({} pixels), {} widths changed".format(
+                    len(self.added), len(self.removed), len(self.changed_glyphs),
+                    int(self.pixel_deltas.sum()), len(self.changed_widths))
+
+    def lines(self):
+        """
+            one line per codepoint, e.g. for a build log
+        """
+        lines = [ "+ U+{:04X}".format(c) for c in self.added.tolist() ]
+        lines += [ "- U+{:04X}".format(c) for c in self.removed.tolist() ]
+        lines += [ "~ U+{:04X} glyph, {} pixels".format(c, d)
+                   for c, d in zip(self.changed_glyphs.tolist(), self.pixel_deltas.tolist()) ]
+        lines += [ "~ U+{:04X} width {} -> {}".format(c, tuple(o), tuple(n))
+                   for c, o, n in zip(self.changed_widths.tolist(),
+                                      self.old_widths.tolist(), self.new_widths.tolist()) ]
+        return lines
+
+def _tile_rows(nftr):
+    """
+        packed tiles as a (N, tile_bytes_size) uint8 array, no copy
+    """
+    return np.frombuffer(nftr.chara_glyph_bytes, dtype=np.uint8,
+                         count=nftr.num_of_tiles * nftr.tile_bytes_size) \
+             .reshape(nftr.num_of_tiles, nftr.tile_bytes_size)
+
+def _widths_of(nftr, tiles):
+    widths = np.zeros(len(tiles), dtype=WIDTH_DTYPE)
+    valid = (tiles >= 0) & (tiles < len(nftr.chara_widths))
+    widths[valid] = nftr.chara_widths[tiles[valid]]
+    return widths
+
+def _same_tile_format(old, new):
+    return (old.tile_width, old.tile_height, old.tile_depth, old.tile_bytes_size) \
+            == (new.tile_width, new.tile_height, new.tile_depth, new.tile_bytes_size)
+
+def _pixel_deltas(old, new, old_tiles, new_tiles):
+    """
+        different pixels of every pair of tiles, the decoded glyphs are
+        compared on the largest tile size (the missing area is 0)
+    """
+    old_images = old.get_glyph_images(old_tiles)
+    new_images = new.get_glyph_images(new_tiles)
+    if old_images.shape[1:] != new_images.shape[1:]:
+        height = max(old_images.shape[1], new_images.shape[1])
+        width = max(old_images.shape[2], new_images.shape[2])
+        old_images = np.pad(old_images, ((0, 0), (0, height - old_images.shape[1]),
+                                         (0, width - old_images.shape[2])))
+        new_images = np.pad(new_images, ((0, 0), (0, height - new_images.shape[1]),
+                                         (0, width - new_images.shape[2])))
+    return np.count_nonzero(old_images != new_images, axis=(1, 2))
+
+def diff_nftr(old, new):
+    """
+        compare two NFTR codepoint by codepoint (a tile reorder or a dedup
+        is not a change), every codepoint is compared at once:
+        - the character maps are aligned on the codepoints of both fonts
+        - with the same tile format, tiles are compared on their packed
+          bytes, and only the changed ones are decoded to count pixels
+        - otherwise the decoded glyphs are compared
+
+        return: FontDiff
+    """
+    # sorted and unique already
+    old_charas = old.merged_cmaps.characters()
+    new_charas = new.merged_cmaps.characters()
+    added = np.setdiff1d(new_charas, old_charas, assume_unique=True)
+    removed = np.setdiff1d(old_charas, new_charas, assume_unique=True)
+
+    charas = np.intersect1d(old_charas, new_charas, assume_unique=True)
+    old_tiles = old.merged_cmaps.lookup_many(charas)
+    new_tiles = new.merged_cmaps.lookup_many(charas)
+    # a codepoint mapped to a tile past the end of CGLP has no glyph
+    old_has = (old_tiles >= 0) & (old_tiles < old.num_of_tiles)
+    new_has = (new_tiles >= 0) & (new_tiles < new.num_of_tiles)
+    both = old_has & new_has
+
+    glyph_changed = old_has != new_has
+    if _same_tile_format(old, new):
+        old_rows, new_rows = _tile_rows(old), _tile_rows(new)
+        glyph_changed[both] = np.any(old_rows[old_tiles[both]] != new_rows[new_tiles[both]], axis=1)
+        compare = glyph_changed & both
+    else:
+        compare = both
+
+    pixel_deltas = np.zeros(len(charas), dtype=np.int64)
+    pixel_deltas[compare] = _pixel_deltas(old, new, old_tiles[compare], new_tiles[compare])
+    glyph_changed[compare] = pixel_deltas[compare] > 0
+    # a glyph added to or removed from a codepoint
+    only = glyph_changed & ~both
+    pixel_deltas[only & old_has] = old.tile_width * old.tile_height
+    pixel_deltas[only & new_has] = new.tile_width * new.tile_height
+
+    old_widths = _widths_of(old, old_tiles)
+    new_widths = _widths_of(new, new_tiles)
+    width_changed = old_widths != new_widths
+
+    return FontDiff(added, removed,
+                    charas[glyph_changed], pixel_deltas[glyph_changed],
+                    charas[width_changed], old_widths[width_changed], new_widths[width_changed])
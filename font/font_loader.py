@@ -0,0 +1,123 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from nftr import NFTR
+
+
+class LoadResult:
+    """
+        outcome of loading one file with load_fonts,
+        font is None and error is set if the file could not be loaded
+    """
+    def __init__(self, path, font=None, error=None):
+        self.path = path
+        self.font = font
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return "LoadResult({!r}, {} tiles)".format(self.path, self.font.num_of_tiles)
+        return "LoadResult({!r}, error={!r})".format(self.path, self.error)
+
+def find_fonts(root, extensions=(".nftr",)):
+    """
+        paths of every font file under root (e.g. an extracted ROM filesystem)
+    """
+    paths = []
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in file_names:
+            if os.path.splitext(file_name)[1].lower() in extensions:
+                paths.append(os.path.join(dir_path, file_name))
+    return sorted(paths)
+
+def _read_file(path):
+    with open(path, "rb") as fp:
+        return fp.read()
+
+def _decode_font(data, nftr_kwargs):
+    return NFTR(data, **nftr_kwargs)
+
+def _read_and_decode(path, nftr_kwargs):
+    return _decode_font(_read_file(path), nftr_kwargs)
+
+def _open_lazy(path, nftr_kwargs):
+    return NFTR(path, lazy=True, **nftr_kwargs)
+
+def load_fonts(paths, max_pending: int = 8,
+               max_readers: int = 4, max_decoders: int = -1,
+               lazy: bool = False, **nftr_kwargs):
+    """
+        load many NFTR files, the file reads (thread pool) overlap with the
+        glyph decoding (process pool); yield a LoadResult for every file as
+        soon as it is loaded (not in the order of paths)
+
+        an error in one file (corrupt font, missing file, ...) is reported in
+        its LoadResult and does not stop the others
+
+        max_pending: files read or decoded at the same time (bounds memory)
+        max_readers: reading threads
+        max_decoders: decoding processes, -1 for the cpu count,
+                      0 to decode in the reading threads instead
+        lazy: mmap the files (NFTR(lazy=True)) in the threads, nothing to decode
+        nftr_kwargs: passed to NFTR (e.g. cache, dedup); with stats, the fonts
+                     are decoded in the reading threads (as max_decoders=0),
+                     so every load fills the caller's NFTRStats and its
+                     callback is not pickled into a process
+
+        usage:
+            for result in load_fonts(find_fonts("rom/data")):
+                if result.ok: ...
+    """
+    if max_decoders == -1:
+        max_decoders = os.cpu_count() or 1
+    use_processes = max_decoders > 0 and not lazy and nftr_kwargs.get("stats") is None
+
+    readers = ThreadPoolExecutor(max_workers=max_readers)
+    decoders = ProcessPoolExecutor(max_workers=max_decoders) if use_processes else None
+
+    # future -> (path, stage), stage is "read" or "decode"
+    pending = {}
+    paths = iter(paths)
+
+    def submit_next():
+        path = next(paths, None)
+        if path is None:
+            return False
+        if lazy:
+            future = readers.submit(_open_lazy, path, nftr_kwargs)
+            pending[future] = (path, "decode")
+        elif use_processes:
+            pending[readers.submit(_read_file, path)] = (path, "read")
+        else:
+            pending[readers.submit(_read_and_decode, path, nftr_kwargs)] = (path, "decode")
+        return True
+
+    try:
+        while len(pending) < max_pending and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, stage = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    yield LoadResult(path, error=error)
+                    submit_next()
+                elif stage == "read":
+                    # the file slot stays taken until the font is decoded
+                    pending[decoders.submit(_decode_font, future.result(), nftr_kwargs)] = \
+                        (path, "decode")
+                else:
+                    yield LoadResult(path, font=future.result())
+                    submit_next()
+    finally:
+        for future in pending:
+            future.cancel()
+        readers.shutdown(wait=True)
+        if decoders is not None:
+            decoders.shutdown(wait=True)
@@ -0,0 +1,148 @@
+import struct
+import zlib
+
+import numpy as np
+
+# 3x5 pixels hex digits for the codepoint labels
+HEX_DIGITS = np.array([
+    [ [ c == "#" for c in row ] for row in digit.split() ]
+    for digit in (
+        "### #.# #.# #.# ###",  # 0
+        ".#. ##. .#. .#. ###",  # 1
+        "### ..# ### #.. ###",  # 2
+        "### ..# ### ..# ###",  # 3
+        "#.# #.# ### ..# ..#",  # 4
+        "### #.. ### ..# ###",  # 5
+        "### #.. ### #.# ###",  # 6
+        "### ..# ..# ..# ..#",  # 7
+        "### #.# ### #.# ###",  # 8
+        "### #.# ### ..# ###",  # 9
+        "### #.# ### #.# #.#",  # A
+        "##. #.# ##. #.# ##.",  # B
+        "### #.. #.. #.. ###",  # C
+        "##. #.# #.# #.# ##.",  # D
+        "### #.. ### #.. ###",  # E
+        "### #.. ### #.. #..",  # F
+    )
+], dtype=np.uint8) * 255
+LABEL_HEIGHT = HEX_DIGITS.shape[1] + 1
+
+
+def label_strips(labels, num_of_digits: int = 4):
+    """
+        labels: N codepoints, -1 for no label
+        return: uint8 array of shape (N, 5, num_of_digits * 4 - 1), the hex
+                codepoints drawn in 255 on 0
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    shifts = 4 * np.arange(num_of_digits - 1, -1, -1)
+    digits = (labels[:, None] >> shifts) & 0xF
+    glyphs = HEX_DIGITS[digits]                                  # (N, D, 5, 3)
+    glyphs = np.pad(glyphs, ((0, 0), (0, 0), (0, 0), (0, 1)))    # 1 pixel between digits
+    strips = glyphs.transpose(0, 2, 1, 3).reshape(len(labels), HEX_DIGITS.shape[1], -1)[:, :, :-1]
+    strips[labels < 0] = 0
+    return strips
+
+def build_atlas(images, columns: int = -1, scale: int = 1, padding: int = 1,
+                labels=None, grid: int = 64):
+    """
+        tile every glyph into one grid image, row by row
+
+        images: (N, H, W) array, uint8 (e.g. NFTR.glyph_images) or bool
+        columns: glyphs per row, -1 for a square-ish atlas
+        scale: nearest neighbour upscaling factor
+        padding: grid lines between the glyphs, in pixels (before scaling)
+        labels: N codepoints drawn in hex above every glyph, -1 for no label
+        grid: gray level of the grid lines
+        return: uint8 array of shape (height, width)
+    """
+    images = np.asarray(images)
+    if images.dtype == bool:
+        images = images.astype(np.uint8) * 255
+    n, height, width = images.shape
+
+    cell_height, cell_width, top = height, width, 0
+    if labels is not None:
+        num_of_digits = max(4, len("{:X}".format(int(np.max(labels, initial=0)))))
+        strips = label_strips(labels, num_of_digits)
+        top = LABEL_HEIGHT
+        cell_height += top
+        cell_width = max(width, strips.shape[2])
+
+    if columns == -1:
+        columns = max(1, int(np.ceil(np.sqrt(n * cell_height / cell_width))))
+    rows = max(1, -(-n // columns))
+
+    cells = np.full((rows * columns, cell_height + padding, cell_width + padding),
+                    grid, dtype=np.uint8)
+    cells[:, :cell_height, :cell_width] = 0
+    cells[:n, top:cell_height, :width] = images
+    if labels is not None:
+        cells[:n, :strips.shape[1], :strips.shape[2]] = strips
+
+    atlas = cells.reshape(rows, columns, cell_height + padding, cell_width + padding) \
+                 .transpose(0, 2, 1, 3) \
+                 .reshape(rows * (cell_height + padding), columns * (cell_width + padding))
+    if padding:
+        atlas = np.pad(atlas, ((padding, 0), (padding, 0)), constant_values=grid)
+    if scale > 1:
+        atlas = atlas.repeat(scale, axis=0).repeat(scale, axis=1)
+    return atlas
+
+def nftr_atlas(nftr, labels: bool = True, by_codepoint: bool = False, **kwargs):
+    """
+        atlas of the tiles of a NFTR (see build_atlas for kwargs)
+
+        labels: label every tile with the lowest codepoint mapped to it
+        by_codepoint: one cell per mapped codepoint in codepoint order,
+                      instead of one cell per tile in tile order
+                      (stable between fonts with reordered tiles)
+    """
+    images = nftr.glyph_images
+    charas = nftr.merged_cmaps.characters()
+    tiles = nftr.merged_cmaps.lookup_many(charas)
+    mapped = (tiles >= 0) & (tiles < nftr.num_of_tiles)
+    charas, tiles = charas[mapped], tiles[mapped]
+
+    if by_codepoint:
+        return build_atlas(images[tiles], labels=charas if labels else None, **kwargs)
+
+    tile_labels = None
+    if labels:
+        tile_labels = np.full(nftr.num_of_tiles, -1, dtype=np.int64)
+        # charas are sorted, the first occurrence is the lowest codepoint
+        uniq, first = np.unique(tiles, return_index=True)
+        tile_labels[uniq] = charas[first]
+    return build_atlas(images, labels=tile_labels, **kwargs)
+
+def png_bytes(image, compress_level: int = 1):
+    """
+        8 bits grayscale PNG of a (height, width) uint8 array
+    """
+    height, width = image.shape
+    # every scanline starts with its filter type, 0 (None)
+    raw = np.zeros((height, width + 1), dtype=np.uint8)
+    raw[:, 1:] = image
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data \
+                + struct.pack(">I", zlib.crc32(tag + data))
+
+    return b"\x89PNG\r\n\x1a\n" \
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)) \
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), compress_level)) \
+            + chunk(b"IEND", b"")
+
+def write_atlas(atlas, file_path, compress_level: int = 1):
+    """
+        .png: 8 bits grayscale PNG, .npy: numpy array,
+        anything else: raw uint8 pixels, row by row
+    """
+    ext = str(file_path).lower().rsplit(".", 1)[-1]
+    if ext == "png":
+        with open(file_path, "wb") as fp:
+            fp.write(png_bytes(atlas, compress_level))
+    elif ext == "npy":
+        np.save(file_path, atlas)
+    else:
+        atlas.tofile(file_path)
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from bit_image import BitImage, LazyBitImageList, decode_bit_images
+from errors import CharacterNotFoundError
+from text_encoding import to_native_codes
+
+# Unicode blocks for GlyphCache.prefetch, (first, last) inclusive
+BLOCKS = {
+    "ascii":     (0x0020, 0x007E),
+    "latin1":    (0x00A0, 0x00FF),
+    "punct":     (0x3000, 0x303F),  # CJK symbols and punctuation
+    "hiragana":  (0x3040, 0x309F),
+    "katakana":  (0x30A0, 0x30FF),
+    "kana":      (0x3040, 0x30FF),
+    "cjk":       (0x4E00, 0x9FFF),  # CJK unified ideographs
+    "fullwidth": (0xFF00, 0xFFEF),
+}
+
+# value of a character known not to be in the NFTR
+_NOT_FOUND = None
+
+
+class GlyphCache:
+    """
+        LRU cache of NFTR.find_character_glyph, for lazy=True fonts and for
+        text drawn glyph by glyph; characters not in the NFTR are cached too
+        (negative cache), and share the max_size entries; entries are keyed
+        by the character codes of the font encoding (NFTR.codec)
+
+        usage:
+            glyphs = GlyphCache(NFTR("font.NFTR", lazy=True), max_size=2048)
+            glyphs.prefetch("kana")
+            image = glyphs["あ"].data
+    """
+    def __init__(self, nftr, max_size: int = 4096):
+        self.nftr = nftr
+        self.max_size = max_size
+        # character code -> BitImage, or _NOT_FOUND; least recently used first
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, chara):
+        return self.key(chara) in self.entries
+
+    def __getitem__(self, chara):
+        return self.get(chara)
+
+    def __repr__(self):
+        return "GlyphCache({} entries, max_size={}, hits={}, misses={}, negative_hits={})".format(
+                    len(self.entries), self.max_size, self.hits, self.misses, self.negative_hits)
+
+    def key(self, chara):
+        return int(self.nftr.character_code(chara))
+
+    def get(self, chara):
+        """
+            chara: str of one character, or character code of the CMAPs
+            return: BitImage of chara
+            raise CharacterNotFoundError if chara is not in the NFTR
+        """
+        key = self.key(chara)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            glyph = self.entries[key]
+            if glyph is _NOT_FOUND:
+                self.negative_hits += 1
+                raise CharacterNotFoundError(chara)
+            self.hits += 1
+            return glyph
+
+        self.misses += 1
+        tp = self.nftr.merged_cmaps.lookup(key)
+        glyph = _NOT_FOUND if tp is None else self.glyphs_of([tp[1]])[0]
+        self.put(key, glyph)
+        if glyph is _NOT_FOUND:
+            raise CharacterNotFoundError(chara)
+        return glyph
+
+    def put(self, key, glyph):
+        self.entries[key] = glyph
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def prefetch(self, block, limit: int = -1):
+        """
+            decode at once and cache the glyphs of every character of a block
+            mapped by the NFTR (the Unicode block is converted to the font
+            encoding and looked up in the CMAP index, unmapped characters are
+            not cached)
+
+            block: name in BLOCKS, or (first, last) Unicode codepoints
+            limit: characters to prefetch at most (from the start of the
+                   block), -1 for max_size
+            return: number of glyphs cached
+        """
+        first, last = BLOCKS[block] if isinstance(block, str) else block
+        if limit == -1:
+            limit = self.max_size
+
+        charas = to_native_codes(np.arange(first, last + 1, dtype=np.uint32), self.nftr.codec)
+        charas = charas[charas >= 0]
+        tiles = self.nftr.find_character_tiles(charas)
+        mapped = (tiles >= 0) & (tiles < self.nftr.num_of_tiles)
+        charas, tiles = charas[mapped][:limit], tiles[mapped][:limit]
+
+        glyphs = self.glyphs_of(tiles)
+        for key, glyph in zip(charas.tolist(), glyphs):
+            self.put(key, glyph)
+        return len(glyphs)
+
+    def glyphs_of(self, tiles):
+        """
+            BitImage of every tile index; on a lazy=True font the packed tiles
+            are decoded here, not through chara_glyphs, whose decoded images
+            are never evicted (only max_size of them are kept by the cache)
+        """
+        nftr = self.nftr
+        if not isinstance(nftr.chara_glyphs, LazyBitImageList):
+            return [ nftr.chara_glyphs[tile] for tile in np.asarray(tiles).tolist() ]
+
+        # gather the packed tiles and decode them in one call
+        rows = np.frombuffer(nftr.chara_glyph_bytes, dtype=np.uint8,
+                             count=nftr.num_of_tiles * nftr.tile_bytes_size) \
+                 .reshape(nftr.num_of_tiles, nftr.tile_bytes_size)[tiles]
+        images = decode_bit_images(rows, len(rows), nftr.tile_width, nftr.tile_height,
+                                   nftr.tile_depth, nftr.tile_bytes_size)
+        return [ BitImage(image, nftr.tile_width, nftr.tile_height, nftr.tile_depth)
+                 for image in images ]
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
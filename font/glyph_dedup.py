@@ -0,0 +1,107 @@
+import numpy as np
+
+from bit_image import LazyBitImageList
+
+
+class DedupReport:
+    """
+        what merging duplicate tiles saved
+    """
+    def __init__(self, num_of_tiles, num_of_unique_tiles, tile_bytes_size,
+                 tile_width, tile_height):
+        self.num_of_tiles = num_of_tiles
+        self.num_of_unique_tiles = num_of_unique_tiles
+        self.num_of_duplicates = num_of_tiles - num_of_unique_tiles
+        # CGLP tiles and CWDH entries
+        self.saved_file_bytes = self.num_of_duplicates * (tile_bytes_size + 3)
+        # decoded (N, H, W) uint8 glyph images
+        self.saved_decoded_bytes = self.num_of_duplicates * tile_width * tile_height
+
+    def __str__(self):
+        return "{} tiles, {} unique ({} duplicates): " \
+               "{} bytes saved in CGLP/CWDH, {} bytes of decoded glyphs".format(
+                    self.num_of_tiles, self.num_of_unique_tiles, self.num_of_duplicates,
+                    self.saved_file_bytes, self.saved_decoded_bytes)
+
+def find_duplicate_tiles(tile_bytes, tile_bytes_size, widths=None):
+    """
+        tiles are the same if their bytes (and CWDH entries, if widths is
+        given) are the same; every tile is compared at once through a
+        byte (np.void) view of the rows of the tile buffer
+
+        tile_bytes: bytes-like, packed tiles
+        widths: WIDTH_DTYPE array (one entry per tile) or None
+        return: (keep, tile_map)
+            keep: indices of the tiles to keep, in their original order
+            tile_map: new index of every original tile
+    """
+    num_of_tiles = len(tile_bytes) // tile_bytes_size
+    rows = np.frombuffer(tile_bytes, dtype=np.uint8, count=num_of_tiles * tile_bytes_size)
+    rows = rows.reshape(num_of_tiles, tile_bytes_size)
+    if widths is not None:
+        rows = np.concatenate([rows, widths.view(np.uint8).reshape(num_of_tiles, -1)], axis=1)
+    rows = np.ascontiguousarray(rows)
+    keys = rows.view(np.dtype((np.void, rows.shape[1]))).reshape(-1)
+
+    _, first_idx, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    # unique tiles ordered by first occurrence
+    order = np.argsort(first_idx, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first_idx[order], rank[inverse.reshape(-1)]
+
+def dedup_tiles(tile_bytes, tile_bytes_size, widths, tile_indices,
+                tile_width=0, tile_height=0):
+    """
+        merge duplicate tiles before building a font, e.g.
+            tiles, widths, tile_indices, report = dedup_tiles(...)
+            nftr_writer.serialize_nftr(tiles, widths, charas, tile_indices, ...)
+
+        tile_indices: tile of every character (-1 for none)
+        return: (tile_bytes, widths, tile_indices, DedupReport)
+                with the duplicates removed and tile_indices remapped
+    """
+    keep, tile_map = find_duplicate_tiles(tile_bytes, tile_bytes_size, widths)
+    tiles = np.frombuffer(tile_bytes, dtype=np.uint8, count=len(tile_map) * tile_bytes_size)
+    tiles = tiles.reshape(-1, tile_bytes_size)[keep].tobytes()
+    tile_indices = np.asarray(tile_indices)
+    tile_indices = np.where(tile_indices >= 0, tile_map[tile_indices], tile_indices)
+    report = DedupReport(len(tile_map), len(keep), tile_bytes_size, tile_width, tile_height)
+    return tiles, widths[keep], tile_indices, report
+
+def dedup_nftr(nftr):
+    """
+        merge the duplicate tiles of a loaded NFTR in place, the glyphs,
+        widths and the character index (merged_cmaps) are remapped
+        (chara_maps still hold the tile numbers of the file)
+        return: DedupReport, also kept as nftr.dedup_report
+    """
+    keep, tile_map = find_duplicate_tiles(nftr.chara_glyph_bytes, nftr.tile_bytes_size,
+                                          nftr.chara_widths)
+    report = DedupReport(nftr.num_of_tiles, len(keep), nftr.tile_bytes_size,
+                         nftr.tile_width, nftr.tile_height)
+    nftr.dedup_report = report
+    if report.num_of_duplicates == 0:
+        return report
+
+    tiles = np.frombuffer(nftr.chara_glyph_bytes, dtype=np.uint8,
+                          count=nftr.num_of_tiles * nftr.tile_bytes_size)
+    nftr.chara_glyph_bytes = tiles.reshape(-1, nftr.tile_bytes_size)[keep].tobytes()
+    nftr.chara_widths = nftr.chara_widths[keep]
+    nftr.num_of_tiles = len(keep)
+    nftr.merged_cmaps.remap_tiles(tile_map)
+    # computed for the old tiles (see glyph_metrics.nftr_glyph_metrics)
+    nftr.glyph_metrics = None
+
+    if nftr._glyph_images is not None:
+        nftr.set_glyph_images(np.ascontiguousarray(nftr._glyph_images[keep]))
+    else:
+        nftr.chara_glyphs = LazyBitImageList(
+                                nftr.chara_glyph_bytes,
+                                nftr.num_of_tiles,
+                                nftr.tile_width,
+                                nftr.tile_height,
+                                nftr.tile_depth,
+                                nftr.tile_bytes_size
+                            )
+    return report
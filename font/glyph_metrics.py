@@ -0,0 +1,98 @@
+import numpy as np
+
+from nftr import WIDTH_DTYPE
+
+# ink extents of a glyph, in pixels from the top left of its tile
+# (all zero for a glyph without ink)
+METRICS_DTYPE = np.dtype([
+    ("left",            np.int16),  # first column with ink (left bearing)
+    ("right",           np.int16),  # last column with ink + 1
+    ("top",             np.int16),  # first row with ink
+    ("bottom",          np.int16),  # last row with ink + 1
+    ("ink_width",       np.int16),
+    ("ink_height",      np.int16),
+    ("baseline_offset", np.int16),  # baseline - bottom, < 0 for descenders
+    ("empty",           np.bool_),
+])
+
+
+def glyph_metrics(images, baseline: int = -1, threshold: int = 0):
+    """
+        ink extents of every glyph at once
+
+        images: (N, H, W) array with 0 as background (e.g. NFTR.glyph_images
+                or CharFont.char_images(..., ink=True))
+        baseline: row of the baseline, -1 for the bottom of the tile
+        threshold: pixels > threshold are ink
+        return: METRICS_DTYPE array of N
+    """
+    images = np.asarray(images)
+    n, height, width = images.shape
+    if baseline == -1:
+        baseline = height
+
+    ink = images > threshold
+    ink_cols = ink.any(axis=1)  # (N, W)
+    ink_rows = ink.any(axis=2)  # (N, H)
+    empty = ~ink_cols.any(axis=1)
+
+    metrics = np.zeros(n, dtype=METRICS_DTYPE)
+    metrics["left"] = ink_cols.argmax(axis=1)
+    metrics["right"] = width - ink_cols[:, ::-1].argmax(axis=1)
+    metrics["top"] = ink_rows.argmax(axis=1)
+    metrics["bottom"] = height - ink_rows[:, ::-1].argmax(axis=1)
+    metrics["ink_width"] = metrics["right"] - metrics["left"]
+    metrics["ink_height"] = metrics["bottom"] - metrics["top"]
+    metrics["baseline_offset"] = baseline - metrics["bottom"]
+    metrics["empty"] = empty
+    metrics[empty] = np.zeros(1, dtype=METRICS_DTYPE)
+    metrics["empty"] = empty
+    return metrics
+
+def nftr_glyph_metrics(nftr, batch_size: int = 4096, threshold: int = 0):
+    """
+        metrics of every tile of a NFTR, computed batch by batch (bounded
+        memory, also for lazy=True) and cached in nftr.glyph_metrics;
+        the baseline is the CGLP underline location
+    """
+    if nftr.glyph_metrics is None:
+        metrics = np.zeros(nftr.num_of_tiles, dtype=METRICS_DTYPE)
+        for tile_indices, images in nftr.iter_glyph_batches(batch_size):
+            metrics[tile_indices] = glyph_metrics(
+                                        images, nftr.chara_glyph_underline_location, threshold)
+        nftr.glyph_metrics = metrics
+    return nftr.glyph_metrics
+
+def widths_from_metrics(metrics, left_spacing: int = 0, right_spacing: int = 1,
+                        empty_advance: int = -1):
+    """
+        CWDH entries for glyphs drawn from their tile: the ink starts
+        left_spacing pixels after the pen, and the pen moves past the ink
+        plus right_spacing
+
+        empty_advance: advance of glyphs without ink (e.g. space),
+                       -1 for the mean advance of the other glyphs / 2
+        return: WIDTH_DTYPE array
+    """
+    widths = np.zeros(len(metrics), dtype=WIDTH_DTYPE)
+    widths["left"] = np.clip(left_spacing - metrics["left"], -128, 127)
+    widths["glyph_width"] = np.clip(metrics["right"], 0, 255)
+    advance = left_spacing + metrics["ink_width"].astype(np.int64) + right_spacing
+
+    empty = metrics["empty"]
+    if empty_advance == -1:
+        empty_advance = int(advance[~empty].mean() // 2) if (~empty).any() else 0
+    advance[empty] = empty_advance
+    widths["left"][empty] = 0
+    widths["advance"] = np.clip(advance, 0, 255)
+    return widths
+
+def check_widths(metrics, widths):
+    """
+        tiles whose CWDH entry cuts the ink off (glyph_width before the
+        right edge of the ink), or draws it before the pen position
+        return: bool array, True for a wrong entry
+    """
+    clipped = widths["glyph_width"].astype(np.int64) < metrics["right"]
+    before_pen = widths["left"].astype(np.int64) + metrics["left"] < 0
+    return ~metrics["empty"] & (clipped | before_pen)
@@ -1,22 +1,42 @@
 import numpy as np
-from bits_utils import bit_array_to_byte_array
+from bits_utils import np_bit_array_to_byte_array, np_bit_depth_quantize
 
 def padded_len(origin_len, depth):
     return ((origin_len -1) // depth + 1) * depth
 
-def _np_bool_array_to_byte_array(image, byte_order_flag="big"):
-    flatted = image.flatten()
-    pad_len = padded_len(flatted.shape[0], 8)
-    padded_zeros = np.zeros(pad_len - flatted.shape[0]) 
-    flatted = np.append(flatted, padded_zeros)
+def images_to_byte_array(images, bit_depth, image_bytes_size=-1, byte_order_flag="big"):
+    """
+        inverse of bit_image.decode_bit_images, encode a batch of images
+        (e.g. glyphs rendered by CharFont.char_images(..., ink=True)) into
+        packed tiles at once
+
+        images: numpy array of shape (N, H, W), uint8 (0 = transparent,
+                255 = solid, quantized to bit_depth) or bool (True = solid);
+                CharFont renders black on white unless ink=True
+        image_bytes_size: bytes per image, -1 for (W*H*bit_depth+7)//8
+        return: uint8 numpy array of shape (N, image_bytes_size),
+                .tobytes() is the tile data of a CGLP chunk
+    """
+    images = np.asarray(images)
+    assert(images.ndim == 3)
+    assert(images.dtype in [np.bool_, np.uint8])
 
-    return bit_array_to_byte_array(flatted, byte_order_flag)
+    vals = np_bit_depth_quantize(images, bit_depth)
+    vals = vals.reshape(images.shape[0], -1)
+    return np_bit_array_to_byte_array(vals, bit_depth, byte_order_flag, image_bytes_size)
+
+def _np_bool_array_to_byte_array(image, byte_order_flag="big"):
+    return images_to_byte_array(image[None], 1, byte_order_flag=byte_order_flag)[0]
 
-def image_to_byte_array(image, byte_order_flag="big"):
-    if isinstance(image, np.array):
+def image_to_byte_array(image, byte_order_flag="big", bit_depth=1):
+    """
+        image: numpy array of shape (H, W), bool or uint8
+        bit_depth: bits per pixel for an uint8 image (a bool image is 1 bpp)
+    """
+    if isinstance(image, np.ndarray):
         image_dtype = image.dtype
-        assert(image_dtype in [np.bool, np.unit8])
+        assert(image_dtype in [np.bool_, np.uint8])
 
-        if image_dtype == np.bool:
+        if image_dtype == np.bool_:
             return _np_bool_array_to_byte_array(image, byte_order_flag)
-        
\ No newline at end of file
+        return images_to_byte_array(image[None], bit_depth, byte_order_flag=byte_order_flag)[0]
@@ -1,35 +1,90 @@
+import mmap
 import os
+import struct
+import time
+from contextlib import nullcontext
 from enum import Enum
 
-from bit_image import BitImage
+import numpy as np
+from bit_image import BitImageList, LazyBitImageList, decode_bit_images
+from cmap_index import CMAPIndex
+from errors import CharacterNotFoundError, NFTRFormatError
+from glyph_dedup import dedup_nftr
+from text_encoding import CODECS, codepoints_of, to_native_codes
+
+
+def struct_layouts(fmt):
+    """
+        precompiled struct.Struct of fmt for both byte orders
+    """
+    return {
+        "little": struct.Struct("<" + fmt),
+        "big":    struct.Struct(">" + fmt),
+    }
+
+def as_buffer(data):
+    """
+        bytes-like (bytes, bytearray, memoryview, mmap, ...) -> byte memoryview
+    """
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    if view.format != "B" or view.ndim != 1:
+        view = view.cast("B")
+    return view
+
+_NO_TIMER = nullcontext()
+
+def timer(stats, event, **info):
+    """
+        stats.timer(event), or a no-op context if stats is None
+    """
+    return _NO_TIMER if stats is None else stats.timer(event, **info)
+
+def uint16_array(data, offset, count, byte_order_flag="little"):
+    """
+        count uint16 at data[offset:], as a native uint16 numpy array
+    """
+    dtype = np.dtype("<u2" if byte_order_flag == "little" else ">u2")
+    array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+    return array.astype(np.uint16)
 
 
 class CMAP:
-    def __init__(self, fp, offset, byte_order_flag="little"):
+    # Signature, Chunk Size, First Char, Last Char, Map Type, Offset to next Map+8
+    HEADER = struct_layouts("4sIHHII")
+    # TileNo for First Char, padding
+    TYPE0 = struct_layouts("HH")
+    # Number of following Char=Tile groups
+    TYPE2 = struct_layouts("H")
+
+    def __init__(self, data, offset, byte_order_flag="little"):
+        """
+            data: bytes-like, the whole NFTR file
+            offset: offset of the CMAP chunk in data
+        """
         if byte_order_flag in ["little", "big"]:
             self.byte_order_flag = byte_order_flag
         else:
             raise Exception("byte order?")
-        
-        fp.seek(offset, os.SEEK_SET)
+
+        (
+            signature,
+            # Chunk Size (14h+...+padding)
+            self.chunk_size,
+            # 2 bytes
+            self.first_character,
+            self.last_character,
+            # Map Type (0, 1, 2)
+            self.map_type,
+            # Offset to next Character Map, plus 8 （to the start of file)
+            self.offset_to_next_map_p8,
+        ) = CMAP.HEADER[byte_order_flag].unpack_from(data, offset)
 
         # CMAP Header
-        if (fp.read(4) != b"PAMC"):
-            raise Exception("CMAP chunk format error")
-        
-        # Chunk Size (14h+...+padding)
-        self.chunk_size = self.bytes_to_int(fp.read(4))
+        if (signature != b"PAMC"):
+            raise NFTRFormatError("CMAP chunk format error")
 
-        # 2 bytes 
-        self.first_character = self.bytes_to_int(fp.read(2))
-        self.last_character = self.bytes_to_int(fp.read(2))
         self.num_of_characters = self.last_character - self.first_character + 1
-
-        # Map Type (0, 1, 2)
-        self.map_type = self.bytes_to_int(fp.read(4))
-
-        # Offset to next Character Map, plus 8 （to the start of file)
-        self.offset_to_next_map_p8 = self.bytes_to_int(fp.read(4))
+        offset += CMAP.HEADER[byte_order_flag].size
 
         # For Map Type0, Increasing TileNo's assigned to increasing CharNo's:
         #   14h      2    TileNo for First Char (and increasing for further chars)
@@ -43,63 +98,132 @@ class CMAP:
         #   18h+N*4  2    Tile Number
         #   ...      2    Padding to 4-byte boundary (zerofilled)
         if self.map_type == 0:
-            self.tile_num_for_first_chara = self.bytes_to_int(fp.read(2))
-            fp.read(2) # padding
+            self.tile_num_for_first_chara, _ = CMAP.TYPE0[byte_order_flag].unpack_from(data, offset)
         elif self.map_type == 1:
-            self.tile_nums = []
-            for i in range(self.num_of_characters):
-                self.tile_nums.append(self.bytes_to_int(fp.read(2)))
-            if len(self.tile_nums) % 4 != 0:
-                fp.read(2) # padding
+            self.tile_nums = uint16_array(data, offset, self.num_of_characters, byte_order_flag)
         elif self.map_type == 2:
-            self.num_of_custom_assigned_tiles = self.bytes_to_int(fp.read(2))
+            (self.num_of_custom_assigned_tiles,) = CMAP.TYPE2[byte_order_flag].unpack_from(data, offset)
+            offset += CMAP.TYPE2[byte_order_flag].size
+            pairs = uint16_array(data, offset, self.num_of_custom_assigned_tiles * 2, byte_order_flag)
             # character -> tile num
-            self.custom_dict = {}
-            for i in range(self.num_of_custom_assigned_tiles):
-                char_no = self.bytes_to_int(fp.read(2))
-                tile_no = self.bytes_to_int(fp.read(2))
-                self.custom_dict[char_no] = tile_no
-            fp.read(2) # padding
-       
+            self.custom_charas = pairs[0::2]
+            self.custom_tiles = pairs[1::2]
 
-    def bytes_to_int(self, bts):
-        return int.from_bytes(bts, self.byte_order_flag)
+    @property
+    def custom_dict(self):
+        """
+            Map Type2 as a dict {character: tile num}
+        """
+        return dict(zip(self.custom_charas.tolist(), self.custom_tiles.tolist()))
 
 def merge_CMAP(cmaps: list[CMAP]):
     """
-        return a dict {chara: (cmap_idx, tile_idx)}
+        return a CMAPIndex, works like a dict {chara: (cmap_idx, tile_idx)}
+        without holding one entry per character
     """
-    ret_dict = {}
-    for i in range(len(cmaps)):
-        if cmaps[i].map_type == 0:
-            tile_num = cmaps[i].tile_num_for_first_chara
-            for chara in range(cmaps[i].first_character, cmaps[i].last_character + 1):
-                ret_dict[chara] = (i, tile_num)
-                tile_num += 1
-        elif cmaps[i].map_type == 1:
-            tile_num_idx = 0
-            for chara in range(cmaps[i].first_character, cmaps[i].last_character + 1):
-                ret_dict[chara] = (i, cmaps[i].tile_nums[tile_num_idx])
-                tile_num_idx += 1
-        elif cmaps[i].map_type == 2:
-            for chara in cmaps[i].custom_dict.keys():
-                ret_dict[chara] = (i, cmaps[i][chara])
-        
-    return ret_dict
+    return CMAPIndex(cmaps)
+
+# CWDH entry of a tile
+WIDTH_DTYPE = np.dtype([
+    ("left",        np.int8),   # Left Spacing (signed)
+    ("glyph_width", np.uint8),  # Width of the glyph bitmap
+    ("advance",     np.uint8),  # Total Width, including left/right spacing
+])
 
 #############################################################
+# bump when the decoded output changes, invalidates FontCache entries
+PARSER_VERSION = 1
+
 class NFTR:
     """
         REF: https://problemkaputt.de/gbatek-ds-cartridge-nitro-font-resource-format.htm \n
     """
-    def __init__(self, file_path: str):
-        with open(file_path, "rb") as fp:
-            self.get_header_chunk(fp)
-            self.get_font_info_chunk(fp)
-            self.get_character_glyph_chunk(fp)
-            self.get_character_width_chunk(fp)
-            self.get_character_map_chunks(fp)
-        
+    def __init__(self, file_path, lazy: bool = False, cache=None, dedup: bool = False,
+                 stats=None):
+        """
+            file_path: path of the NFTR file, or the file content already in
+                       memory as any bytes-like object (bytes, bytearray,
+                       memoryview, mmap, ...), e.g. extracted from a NARC
+            lazy: only parse the chunk headers and tables, a glyph is decoded
+                  when first accessed; a file is mmap-ed instead of read
+                  (call close() or use `with` to release the mapping)
+            cache: FontCache, decoded glyphs are loaded from / saved to it
+            dedup: merge duplicate tiles after loading (see glyph_dedup),
+                   the result is in self.dedup_report
+            stats: NFTRStats, filled with the timings and counters of the
+                   load and of the lookups afterwards
+        """
+        self.chunk_offsets = dict(NFTR.chunk_offsets)
+        self.lazy = lazy
+        self.cache = cache
+        self.stats = stats
+        self._mmap = None
+        self._glyph_images = None
+        self.dedup_report = None
+        # METRICS_DTYPE array, set by glyph_metrics.nftr_glyph_metrics
+        self.glyph_metrics = None
+
+        if isinstance(file_path, (str, os.PathLike)):
+            with open(file_path, "rb") as fp:
+                if lazy:
+                    with timer(stats, "mmap"):
+                        self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                    data = self._mmap
+                else:
+                    with timer(stats, "read"):
+                        data = fp.read()
+                    if stats is not None:
+                        stats.read_calls += 1
+                        stats.bytes_read += len(data)
+        else:
+            data = file_path
+        self._data = as_buffer(data)
+        if cache is not None:
+            with timer(stats, "cache_key"):
+                self._cache_key = cache.key(self._data, PARSER_VERSION)
+
+        try:
+            with timer(stats, "header"):
+                self.get_header_chunk(self._data)
+            with timer(stats, "font_info"):
+                self.get_font_info_chunk(self._data)
+            with timer(stats, "character_glyph"):
+                self.get_character_glyph_chunk(self._data)
+            with timer(stats, "character_width"):
+                self.get_character_width_chunk(self._data)
+            self.get_character_map_chunks(self._data)
+        except (struct.error, ValueError) as e:
+            # a chunk or table goes past the end of the data
+            raise NFTRFormatError("truncated NFTR ({})".format(e)) from e
+
+        if not lazy:
+            # everything needed has been copied out
+            self._data = None
+
+        if dedup:
+            dedup_nftr(self)
+
+    def close(self):
+        if self._mmap is not None:
+            # drop every view into the mapping before closing it, the
+            # glyph list may still be referenced by the caller
+            if isinstance(self.chara_glyphs, LazyBitImageList):
+                self.chara_glyphs.release()
+            self.chara_glyphs = None
+            if isinstance(self.chara_glyph_bytes, memoryview):
+                self.chara_glyph_bytes.release()
+            self.chara_glyph_bytes = None
+            self._data.release()
+            self._data = None
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     class FLAGS(Enum): 
         # chunk
         CHUNK_UNFOUND = -1,
@@ -121,87 +245,113 @@ class NFTR:
     }
     byte_order = FLAGS.BO_LITTLE_ENDIAN
     
-    def bytes_to_int(self, bts):
+    # Signature, Byte Order, Version, Decompressed Resource Size,
+    # Offset to FINF, Number of following Chunks
+    HEADER = struct_layouts("4s2sHIHH")
+    # Signature, Chunk Size, unknown, Height, unknown, unknown, Width, Width_bis,
+    # Encoding, Offsets to CGLP/CWDH/CMAP plus 8
+    FONT_INFO = struct_layouts("4sIBBBHBBBIII")
+    # (Chunk Size 20h only) Tile Height, Max Width, Underline location, unknown
+    FONT_INFO_EXT = struct_layouts("BBBB")
+    # Signature, Chunk Size, Tile Width, Tile Height, Tile Size, Underline location,
+    # Max proportional Width, Tile Depth, Tile Rotation
+    CHARACTER_GLYPH = struct_layouts("4sIBBHBBBB")
+    # Signature, Chunk Size, First Tile, Last Tile, unknown
+    CHARACTER_WIDTH = struct_layouts("4sIHHI")
+
+    @property
+    def codec(self):
+        """
+            Python codec of the character codes of the CMAPs (FINF encoding)
+        """
+        return CODECS.get(self.encoding_id, "utf-16")
+
+    @property
+    def byte_order_flag(self):
         if self.byte_order == NFTR.FLAGS.BO_LITTLE_ENDIAN:
-            byte_order_flag = "little"
-        elif self.byte_order == NFTR.FLAGS.BO_LITTLE_ENDIAN:
-            byte_order_flag = "big"
+            return "little"
+        elif self.byte_order == NFTR.FLAGS.BO_BIG_ENDIAN:
+            return "big"
 
-        return int.from_bytes(bts, byte_order_flag)
+    def bytes_to_int(self, bts):
+        return int.from_bytes(bts, self.byte_order_flag)
 
     # NFTR chunk
-    def get_header_chunk(self, fp, offset=0):
-        fp.seek(offset, os.SEEK_SET)
-
+    def get_header_chunk(self, data, offset=0):
         # Header
-        if (fp.read(4) != b"RTFN"):
-            raise Exception("Not a Nitro Font file")
+        if (bytes(data[offset:offset + 4]) != b"RTFN"):
+            raise NFTRFormatError("Not a Nitro Font file")
 
         self.chunk_offsets["header"] = 0
 
         # Byte Order -> FEFFh
-        bo_b1 = fp.read(1) # byte order indicator byte 1
-        bo_b2 = fp.read(1)
-        if bo_b1 == b"\xff" and bo_b2 == b"\xfe":
+        bo = bytes(data[offset + 4:offset + 6])
+        if bo == b"\xff\xfe":
             self.byte_order = NFTR.FLAGS.BO_LITTLE_ENDIAN
-        elif bo_b1 == b"\xfe" and bo_b2 == b"\xff":
+        elif bo == b"\xfe\xff":
             self.byte_order = NFTR.FLAGS.BO_BIG_ENDIAN
         else:
-            raise Exception("No byte order found")
-        
-        # Version
-        self.version = self.bytes_to_int(fp.read(2))
+            raise NFTRFormatError("No byte order found")
+
+        (
+            _, _,
+            # Version
+            self.version,
+            # Decompressed Resource Size
+            self.decomp_res_size,
+            # Offset to "FNIF" Chunk, aka Size of "RTFN" Chunk (0010h)
+            self.chunk_offsets["font_info"],
+            # Total number of following Chunks (0003h+NumCharMaps) (0018h)
+            self.num_of_following_chunk,
+        ) = NFTR.HEADER[self.byte_order_flag].unpack_from(data, offset)
+
         if not (self.version in [ 0x100, 0x101, 0x102]):
             print("unknow NFTR version {}".format(self.version))
 
-        # Decompressed Resource Size
-        self.decomp_res_size = self.bytes_to_int(fp.read(4))
-
-        # Offset to "FNIF" Chunk, aka Size of "RTFN" Chunk (0010h)
-        self.chunk_offsets["font_info"] = self.bytes_to_int(fp.read(2))
-    
-        # Total number of following Chunks (0003h+NumCharMaps) (0018h)
-        self.num_of_following_chunk = self.bytes_to_int(fp.read(2))
-
-        assert(fp.tell() == 16)
-
     # FINF chunk
-    def get_font_info_chunk(self, fp, offset=-1):
+    def get_font_info_chunk(self, data, offset=-1):
         if (offset == -1 and self.chunk_offsets["font_info"]):
             offset = self.chunk_offsets["font_info"]
-        fp.seek(offset, os.SEEK_SET)
+
+        (
+            signature,
+            # Chunk Size (1Ch or 20h)
+            font_info_chunk_size,
+            # unknow/unused
+            unknown_08,
+            # Height or Height+/-1, unsure
+            self.height,
+            # Unknown (usually 00h, or sometimes 1Fh maybe for chr(3Fh)="?")
+            unknown_0a,
+            # Unknown/unused (zero)
+            unknown_0b,
+            # Width or Width+1, unsure
+            self.width,
+            # Width_bis (?)
+            self.width_bis,
+            # encoding
+            enc,
+            # Offset to Character Glyph chunk, plus 8
+            self.offset_to_chara_glyph_chunk_p8,
+            # Offset to Character Width chunk, plus 8
+            self.offset_to_chara_wdith_chunk_p8,
+            # Offset to first Character Map chunk, plus 8
+            self.offset_to_chara_map_chunk_p8,
+        ) = NFTR.FONT_INFO[self.byte_order_flag].unpack_from(data, offset)
 
         # FNIF Header
-        if (fp.read(4) != b"FNIF"):
-            raise Exception("FINF format error")
-        
-        # Chunk Size (1Ch or 20h)
-        font_info_chunk_size = self.bytes_to_int(fp.read(4))
+        if (signature != b"FNIF"):
+            raise NFTRFormatError("FINF format error")
+
+        # kept to write the chunk back as it was
+        self.font_info_unknowns = [unknown_08, unknown_0a, unknown_0b, 0]
+
         if (font_info_chunk_size in [0x1c, 0x20]):
             self.font_info_chunk_size = font_info_chunk_size
         else:
-            raise Exception("unknown font_info_chunk_size")
-
-        # unknow/unused
-        fp.read(1)
-
-        # Height or Height+/-1, unsure
-        self.height = self.bytes_to_int(fp.read(1))
-
-        # Unknown (usually 00h, or sometimes 1Fh maybe for chr(3Fh)="?")
-        temp = fp.read(1)
-
-        # Unknown/unused (zero)
-        temp = fp.read(2)
+            raise NFTRFormatError("unknown font_info_chunk_size")
 
-        # Width or Width+1, unsure
-        self.width = self.bytes_to_int(fp.read(1))
-
-        # Width_bis (?) 
-        temp = fp.read(1)
-
-        # encoding
-        enc = self.bytes_to_int(fp.read(1))
+        self.encoding_id = enc
         if enc == 0:
             self.encoding = NFTR.FLAGS.ENC_UTF8
         elif enc == 1:
@@ -210,167 +360,369 @@ class NFTR:
             self.encoding = NFTR.FLAGS.ENC_SJIS
         elif enc == 3:
             self.encoding = NFTR.FLAGS.ENC_CP1552
-        
-        # Offset to Character Glyph chunk, plus 8
-        self.offset_to_chara_glyph_chunk_p8 = \
-            self.bytes_to_int(fp.read(4))
-        
-        # Offset to Character Width chunk, plus 8
-        self.offset_to_chara_wdith_chunk_p8 = \
-            self.bytes_to_int(fp.read(4))
-    
-        # Offset to first Character Map chunk, plus 8
-        self.offset_to_chara_map_chunk_p8 = \
-            self.bytes_to_int(fp.read(4))
-    
-        if self.font_info_chunk_size == 0x20:
-            self.tile_height = self.bytes_to_int(fp.read(1))
-            # Max Width or so +/-?   
-            self.max_width = self.bytes_to_int(fp.read(1))
-            # Underline location   
-            self.underline_location = self.bytes_to_int(fp.read(1))
-            # unknow/unused
-            temp = self.bytes_to_int(fp.read(1))
 
-        assert(fp.tell() == (offset + self.font_info_chunk_size))
-        self.chunk_offsets["character_glyph"] = fp.tell()
+        if self.font_info_chunk_size == 0x20:
+            (
+                self.tile_height,
+                # Max Width or so +/-?
+                self.max_width,
+                # Underline location
+                self.underline_location,
+                # unknow/unused
+                self.font_info_unknowns[3],
+            ) = NFTR.FONT_INFO_EXT[self.byte_order_flag].unpack_from(
+                    data, offset + NFTR.FONT_INFO[self.byte_order_flag].size)
+
+        self.chunk_offsets["character_glyph"] = offset + self.font_info_chunk_size
 
     # CGLP (Character Glyph Chunk) (Tile Bitmaps)
-    def get_character_glyph_chunk(self, fp, offset=-1):
+    def get_character_glyph_chunk(self, data, offset=-1):
         if (offset == -1 and self.chunk_offsets["character_glyph"]):
             offset = self.chunk_offsets["character_glyph"]
-        fp.seek(offset, os.SEEK_SET)
 
-        # FNIF Header
-        if (fp.read(4) != b"PLGC"):
-            raise Exception("CGLP format error")
-    
-        # Chunk Size (10h+NumTiles*siz+padding)
-        self.chara_glyph_chunk_size = self.bytes_to_int(fp.read(4))
-
-        # Tile Width in pixels
-        self.tile_width = self.bytes_to_int(fp.read(1))
-        # Tile height in pixels
-        self.tile_height = self.bytes_to_int(fp.read(1))
-
-        # Tile Size in bytes (siz=width*height*bpp+7)/8) = per character
-        self.tile_bytes_size = self.bytes_to_int(fp.read(2))
-
-        # underline location 
-        self.chara_glyph_underline_location = self.bytes_to_int(fp.read(1))
-
-        # Max proportional Width including left/right spacing
-        self.max_proportional_width = self.bytes_to_int(fp.read(1))
-
-        # Tile Depth (bits per pixel) (usually 1 or 2, sometimes 3)
-        self.tile_depth = self.bytes_to_int(fp.read(1))
-
-        # TODO
-        # Tile Rotation (0=None/normal, other:
-        # All tiles are starting on a byte boundary. However, the separate scanlines aren't
-        # necessarily byte-aligned (for example, at 10pix width, a byte may contain rightmost
-        # pixels of one line, followed by leftmost pixels of next line).
-        # Bit7 of the first byte of a bitmap is the MSB of the upper-left pixel, 
-        # bit6..0 are then containing the LSB(s) of the pixel (if bpp>1), followed by 
-        # the next pixels of the scanline, followed by further scanlines; 
-        # the data is arranged as straight Width*Height bitmap (without splitting into 8x8 sub-tiles).
-        # Colors are ranging from Zero (transparent/background color) to all bit(s) set (solid/text color).
-        # The meaning of the Tile Rotation entry is unclear
-        # (one source claims 0=0', 1=90', 2=270', 3=180', and another source claims 0=0', 2=90', 
-        # 4=180', 6=270', and for both sources, it's unclear 
-        # if the rotation is meant to be clockwise or anti-clockwise).
-        
-        self.tile_rotation = self.bytes_to_int(fp.read(1))
+        (
+            signature,
+            # Chunk Size (10h+NumTiles*siz+padding)
+            self.chara_glyph_chunk_size,
+            # Tile Width in pixels
+            self.tile_width,
+            # Tile height in pixels
+            self.tile_height,
+            # Tile Size in bytes (siz=width*height*bpp+7)/8) = per character
+            self.tile_bytes_size,
+            # underline location
+            self.chara_glyph_underline_location,
+            # Max proportional Width including left/right spacing
+            self.max_proportional_width,
+            # Tile Depth (bits per pixel) (usually 1 or 2, sometimes 3)
+            self.tile_depth,
+            # TODO
+            # Tile Rotation (0=None/normal, other:
+            # All tiles are starting on a byte boundary. However, the separate scanlines aren't
+            # necessarily byte-aligned (for example, at 10pix width, a byte may contain rightmost
+            # pixels of one line, followed by leftmost pixels of next line).
+            # Bit7 of the first byte of a bitmap is the MSB of the upper-left pixel, 
+            # bit6..0 are then containing the LSB(s) of the pixel (if bpp>1), followed by 
+            # the next pixels of the scanline, followed by further scanlines; 
+            # the data is arranged as straight Width*Height bitmap (without splitting into 8x8 sub-tiles).
+            # Colors are ranging from Zero (transparent/background color) to all bit(s) set (solid/text color).
+            # The meaning of the Tile Rotation entry is unclear
+            # (one source claims 0=0', 1=90', 2=270', 3=180', and another source claims 0=0', 2=90', 
+            # 4=180', 6=270', and for both sources, it's unclear 
+            # if the rotation is meant to be clockwise or anti-clockwise).
+            self.tile_rotation,
+        ) = NFTR.CHARACTER_GLYPH[self.byte_order_flag].unpack_from(data, offset)
+
+        # CGLP Header
+        if (signature != b"PLGC"):
+            raise NFTRFormatError("CGLP format error")
+        if self.tile_bytes_size == 0:
+            raise NFTRFormatError("tile size of 0 bytes in character glyph chunk")
+
+        self.num_of_tiles = (self.chara_glyph_chunk_size - 0x10) // self.tile_bytes_size
+        tiles_offset = offset + NFTR.CHARACTER_GLYPH[self.byte_order_flag].size
+        self.chara_glyph_offset = tiles_offset
+        tiles_size = self.num_of_tiles * self.tile_bytes_size
+
+        # the cache is looked up once, a hit sets the decoded glyphs
+        cached = self.load_cached_glyph_images()
+        if self.lazy and not cached:
+            # zero-copy view of the tiles, decoded one by one on access
+            self.chara_glyph_bytes = data[tiles_offset:tiles_offset + tiles_size]
+            self.chara_glyphs = LazyBitImageList(
+                                    self.chara_glyph_bytes,
+                                    self.num_of_tiles,
+                                    self.tile_width,
+                                    self.tile_height,
+                                    self.tile_depth,
+                                    self.tile_bytes_size
+                                )
+        else:
+            # all tiles are decoded at once into
+            # self.glyph_images, a (num_of_tiles, tile_height, tile_width) uint8 array
+            self.chara_glyph_bytes = bytes(data[tiles_offset:tiles_offset + tiles_size])
+            if not cached:
+                self.decode_glyph_images(check_cache=False)
 
-        # bytes data stored 
-        self.chara_glyphs = []
-        
-        cur_offset = 0x10
-        while cur_offset < self.chara_glyph_chunk_size:
-            data = fp.read(self.tile_bytes_size)
-            glyph = BitImage(
-                        data, 
-                        self.tile_width, 
+        self.chunk_offsets["character_width"] = offset + self.chara_glyph_chunk_size
+
+    def set_glyph_images(self, images):
+        self._glyph_images = images
+        self.glyph_metrics = None
+        # BitImage views, created on access
+        self.chara_glyphs = BitImageList(self._glyph_images, self.tile_depth)
+
+    def load_cached_glyph_images(self):
+        """
+            return True if the glyph images are found in self.cache
+        """
+        if self.cache is None:
+            return False
+        with timer(self.stats, "font_cache_load"):
+            images = self.cache.load(self._cache_key)
+        if images is None or \
+           images.shape != (self.num_of_tiles, self.tile_height, self.tile_width):
+            if self.stats is not None:
+                self.stats.font_cache_misses += 1
+            return False
+        if self.stats is not None:
+            self.stats.font_cache_hits += 1
+        self.set_glyph_images(images)
+        return True
+
+    def decode_glyph_images(self, check_cache: bool = True):
+        """
+            decode every tile (or load them from self.cache, unless
+            check_cache is False because it has just been looked up)
+        """
+        if check_cache and self.load_cached_glyph_images():
+            return
+        with timer(self.stats, "decode"):
+            images = decode_bit_images(
+                        self.chara_glyph_bytes,
+                        self.num_of_tiles,
+                        self.tile_width,
                         self.tile_height,
-                        self.tile_depth
+                        self.tile_depth,
+                        self.tile_bytes_size
                     )
-            self.chara_glyphs.append(glyph)
-            cur_offset += self.tile_bytes_size
-
-        self.chunk_offsets["character_width"] = offset + self.chara_glyph_chunk_size
+        if self.stats is not None:
+            self.stats.glyphs_decoded += self.num_of_tiles
+        if self.cache is not None:
+            self.cache.store(self._cache_key, images)
+        self.set_glyph_images(images)
+
+    @property
+    def glyph_images(self):
+        """
+            all tiles, (num_of_tiles, tile_height, tile_width) uint8 array
+            (decoded on first use in lazy mode)
+        """
+        if self._glyph_images is None:
+            self.decode_glyph_images()
+        return self._glyph_images
 
     # CWDH chunk
-    def get_character_width_chunk(self, fp, offset=-1):
+    def get_character_width_chunk(self, data, offset=-1):
         if offset == -1:
-            offset = self.chunk_offsets["character_width"] 
-        fp.seek(offset, os.SEEK_SET)
-        
-        # HDWC Header
-        if (fp.read(4) != b"HDWC"):
-            raise Exception("CWDH format error")
-        
-        # Character Width Chunk size
-        self.chara_width_chunk_size = self.bytes_to_int(fp.read(4))
-
-        # First Tile Number (should be 0000h)
-        self.chara_width_num_first_tilex = self.bytes_to_int(fp.read(2))
-        assert(self.chara_width_num_first_tilex == 0)
+            offset = self.chunk_offsets["character_width"]
+
+        (
+            signature,
+            # Character Width Chunk size
+            self.chara_width_chunk_size,
+            # First Tile Number (should be 0000h)
+            self.chara_width_num_first_tilex,
+            # Last Tile Number  (should be NumTiles-1)
+            self.chara_width_num_last_tile,
+            # unknown/unused
+            self.chara_width_unknown,
+        ) = NFTR.CHARACTER_WIDTH[self.byte_order_flag].unpack_from(data, offset)
 
-        # Last Tile Number  (should be NumTiles-1)
-        self.chara_width_num_last_tile = self.bytes_to_int(fp.read(2))
-
-        # unknown/unused
-        temp = fp.read(4)
-        
-        # TODO 
-        # below are tile bitmaps (Padding to 4-byte bound)
-        for idx in range(self.chara_width_num_last_tile + 1):
-            fp.read(1)
-            fp.read(1)
-            fp.read(1)
+        # HDWC Header
+        if (signature != b"HDWC"):
+            raise NFTRFormatError("CWDH format error")
 
-        paddings = (self.chara_width_num_last_tile + 1) * 3 // 4 * 4 + 4 \
-                    -  (self.chara_width_num_last_tile + 1) * 3
+        if self.chara_width_num_first_tilex != 0:
+            raise NFTRFormatError("character width chunk does not start at tile 0")
 
-        fp.read(paddings)
+        # below are tile widths (Padding to 4-byte bound)
+        num_of_widths = self.chara_width_num_last_tile + 1
+        if self.chara_width_chunk_size < 0x10 + num_of_widths * 3:
+            raise NFTRFormatError("chunk size error in character wdith chunk")
 
-        if self.chara_glyph_chunk_size == 0x10 + (self.chara_width_num_last_tile + 1)*3 + paddings \
-           and fp.tell() != (offset + self.chara_width_chunk_size):
-            raise Exception("chunk size error in character wdith chunk")
+        self.chara_widths = np.frombuffer(
+                                data, dtype=WIDTH_DTYPE, count=num_of_widths,
+                                offset=offset + NFTR.CHARACTER_WIDTH[self.byte_order_flag].size
+                            ).copy()
 
         self.chunk_offsets["first_character_map"] = offset + self.chara_width_chunk_size
-        
+
     # CMAP chunk
     # Character Map(s) - Translation Tables for ASCII/JIS/etc to Tile Numbers?
-    def get_character_map_chunks(self, fp, offset=-1):
+    def get_character_map_chunks(self, data, offset=-1):
         if offset == -1:
-            offset = self.chunk_offsets["first_character_map"] 
-        fp.seek(offset, os.SEEK_SET)
-       
-        if self.byte_order == NFTR.FLAGS.BO_LITTLE_ENDIAN:
-            bo_flag = "little"
-        elif self.byte_order == NFTR.FLAGS.BO_BIG_ENDIAN:
-            bo_flag = "big"
-        
+            offset = self.chunk_offsets["first_character_map"]
+
         self.chara_maps = []
         next_char_map_offset = offset 
 
         while True:
-            char_map = CMAP(fp, offset=next_char_map_offset, byte_order_flag=bo_flag)
+            if self.stats is None:
+                char_map = CMAP(data, offset=next_char_map_offset, byte_order_flag=self.byte_order_flag)
+            else:
+                # timed by hand, the map type is only known once parsed
+                start = time.perf_counter()
+                char_map = CMAP(data, offset=next_char_map_offset, byte_order_flag=self.byte_order_flag)
+                self.stats.record("cmap", time.perf_counter() - start,
+                                  index=len(self.chara_maps), map_type=char_map.map_type)
+            self.chara_maps.append(char_map)
             if char_map.offset_to_next_map_p8 != 0:
                 next_char_map_offset = char_map.offset_to_next_map_p8 - 8
-                self.chara_maps.append(char_map)
             else:
                 break
         
-        self.merged_cmaps = merge_CMAP(self.chara_maps)
+        with timer(self.stats, "merge_cmap", num_of_cmaps=len(self.chara_maps)):
+            self.merged_cmaps = merge_CMAP(self.chara_maps)
+
+    def iter_glyph_batches(self, batch_size: int = 1024, start: int = 0, stop: int = -1):
+        """
+            yield (tile_indices, images) for tiles [start, stop), batch_size
+            tiles at a time, images is a (len(tile_indices), tile_height, tile_width)
+            uint8 array
+
+            batches are decoded from chara_glyph_bytes and not kept, with
+            lazy=True memory stays bounded by the batch size whatever the
+            number of tiles (the pages of the mapped file that have been
+            read are released too)
+        """
+        if stop == -1:
+            stop = self.num_of_tiles
+        # pages of the mapped file up to there are released
+        mapped = self._mmap is not None and isinstance(self.chara_glyph_bytes, memoryview) \
+                    and hasattr(mmap, "MADV_DONTNEED")
+        released = 0
+
+        for begin in range(start, stop, batch_size):
+            end = min(begin + batch_size, stop)
+            if self._glyph_images is not None:
+                images = self._glyph_images[begin:end]
+            else:
+                with timer(self.stats, "decode"):
+                    images = decode_bit_images(
+                                self.chara_glyph_bytes[begin * self.tile_bytes_size:end * self.tile_bytes_size],
+                                end - begin,
+                                self.tile_width,
+                                self.tile_height,
+                                self.tile_depth,
+                                self.tile_bytes_size
+                            )
+                if self.stats is not None:
+                    self.stats.glyphs_decoded += end - begin
+                if mapped:
+                    read_end = self.chara_glyph_offset + end * self.tile_bytes_size
+                    read_end = read_end // mmap.PAGESIZE * mmap.PAGESIZE
+                    if read_end > released:
+                        self._mmap.madvise(mmap.MADV_DONTNEED, released, read_end - released)
+                        released = read_end
+            yield np.arange(begin, end), images
+
+    def iter_glyphs(self, batch_size: int = 1024):
+        """
+            yield (tile_index, image) of every tile, see iter_glyph_batches
+        """
+        for tile_indices, images in self.iter_glyph_batches(batch_size):
+            yield from zip(tile_indices.tolist(), images)
+
+    def get_glyph_images(self, tile_indices):
+        """
+            tile_indices: int array
+            return: uint8 array of shape (len(tile_indices), tile_height, tile_width),
+                    in lazy mode only these tiles are decoded
+        """
+        tile_indices = np.asarray(tile_indices, dtype=np.intp)
+        if self._glyph_images is not None:
+            return self._glyph_images[tile_indices]
+        if self.stats is not None:
+            self.count_glyph_cache(tile_indices)
+        images = np.zeros((len(tile_indices), self.tile_height, self.tile_width), dtype=np.uint8)
+        for i, tile_idx in enumerate(tile_indices.tolist()):
+            images[i] = self.chara_glyphs[tile_idx].data
+        return images
+
+    def character_code(self, chara):
+        """
+            str of one character -> its code in the font encoding (see codec),
+            -1 if it cannot be encoded; a character code is kept as it is
+        """
+        if isinstance(chara, str):
+            return int(to_native_codes(codepoints_of(chara), self.codec)[0])
+        return chara
+
+    def find_character_width(self, chara):
+        """
+            chara: str of one character, or character code of the CMAPs
+            return: CWDH entry of chara, with fields left, glyph_width, advance
+        """
+        tp = self.merged_cmaps.lookup(self.character_code(chara))
+        if tp is not None:
+            return self.chara_widths[tp[1]]
+        else:
+            raise CharacterNotFoundError(chara)
+
+    def get_text_widths(self, texts, missing_width: int = 0):
+        """
+            total width in pixels (sum of advance) of every string in texts,
+            all strings are converted to the font encoding and looked up at once
+            texts: list of str
+            missing_width: width of a character not in NFTR
+            return: int64 array of len(texts)
+        """
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.intp, count=len(texts))
+        tiles = self.find_character_tiles("".join(texts))
+
+        advances = np.full(len(tiles), missing_width, dtype=np.int64)
+        found = (tiles >= 0) & (tiles < len(self.chara_widths))
+        advances[found] = self.chara_widths["advance"][tiles[found]]
+
+        # sum per string (np.add.reduceat does not handle empty strings)
+        cum = np.concatenate([[0], np.cumsum(advances)])
+        ends = np.cumsum(lengths)
+        return cum[ends] - cum[ends - lengths]
 
     def find_character_glyph(self, chara):
-        if chara in self.merged_cmaps.keys():
-            tp = self.merged_cmaps[chara]
+        """
+            chara: str of one character, or character code of the CMAPs
+            return: BitImage of chara
+        """
+        if self.stats is not None:
+            with self.stats.timer("find_character_glyph"):
+                return self.find_character_glyph_counted(chara)
+        tp = self.merged_cmaps.lookup(self.character_code(chara))
+        if tp is not None:
             cmap_idx, tile_idx = tp[0], tp[1]
             return self.chara_glyphs[tile_idx]
         else:
-            raise Exception("character not in NFTR")
+            raise CharacterNotFoundError(chara)
+
+    def find_character_glyph_counted(self, chara):
+        """
+            find_character_glyph, counted in self.stats
+        """
+        self.stats.lookups += 1
+        tp = self.merged_cmaps.lookup(self.character_code(chara))
+        if tp is None:
+            self.stats.lookup_misses += 1
+            raise CharacterNotFoundError(chara)
+        self.count_glyph_cache([tp[1]])
+        return self.chara_glyphs[tp[1]]
+
+    def count_glyph_cache(self, tile_indices):
+        """
+            count in self.stats the tiles already decoded (lazy=True) or to be
+            decoded by an access to chara_glyphs
+        """
+        if not isinstance(self.chara_glyphs, LazyBitImageList):
+            return
+        decoded = self.chara_glyphs.decoded
+        tile_indices = np.asarray(tile_indices).tolist()
+        misses = [ tile_idx for tile_idx in tile_indices if tile_idx not in decoded ]
+        self.stats.glyph_cache_hits += len(tile_indices) - len(misses)
+        self.stats.glyph_cache_misses += len(misses)
+        self.stats.glyphs_decoded += len(set(misses))
+
+    def find_character_tiles(self, charas):
+        """
+            charas: str (converted to the font encoding, see codec)
+                    | iterable of int (character codes of the CMAPs)
+            return: int32 numpy array of tile indices, -1 if not in NFTR
+        """
+        if isinstance(charas, str):
+            codes = to_native_codes(codepoints_of(charas), self.codec)
+            tiles = np.full(len(codes), -1, dtype=np.int32)
+            encodable = codes >= 0
+            tiles[encodable] = self.merged_cmaps.lookup_many(codes[encodable])
+            return tiles
+        return self.merged_cmaps.lookup_many(charas)
 
 #############################################################
\ No newline at end of file
@@ -0,0 +1,75 @@
+import time
+from contextlib import contextmanager
+
+
+class NFTRStats:
+    """
+        timings and counters of a NFTR, filled when passed as NFTR(stats=...)
+        (without it, NFTR only checks `self.stats is None`)
+
+        events (timings / calls):
+            read, mmap, cache_key, header, font_info, character_glyph,
+            decode, font_cache_load, character_width, cmap (one per CMAP),
+            merge_cmap, find_character_glyph
+        counters:
+            bytes_read, read_calls: file reads (nothing for an mmap or bytes)
+            glyphs_decoded: tiles decoded from the packed bytes
+            font_cache_hits, font_cache_misses: FontCache
+            glyph_cache_hits, glyph_cache_misses: lazy=True glyphs already
+                                                  decoded or not on lookup
+            lookups, lookup_misses: find_character_glyph calls, characters
+                                    not in NFTR
+
+        callback(event, seconds, info) is called after every timed event,
+        info is a dict (e.g. {"index": 0, "map_type": 1} for cmap)
+
+        usage:
+            stats = NFTRStats()
+            nftr = NFTR("font.NFTR", stats=stats)
+            print(stats)
+    """
+    COUNTERS = [
+        "bytes_read", "read_calls", "glyphs_decoded",
+        "font_cache_hits", "font_cache_misses",
+        "glyph_cache_hits", "glyph_cache_misses",
+        "lookups", "lookup_misses",
+    ]
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        # event -> total seconds / number of times
+        self.timings = {}
+        self.calls = {}
+        for name in NFTRStats.COUNTERS:
+            setattr(self, name, 0)
+
+    def record(self, event, seconds, **info):
+        self.timings[event] = self.timings.get(event, 0.0) + seconds
+        self.calls[event] = self.calls.get(event, 0) + 1
+        if self.callback is not None:
+            self.callback(event, seconds, info)
+
+    @contextmanager
+    def timer(self, event, **info):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(event, time.perf_counter() - start, **info)
+
+    def reset(self):
+        self.timings.clear()
+        self.calls.clear()
+        for name in NFTRStats.COUNTERS:
+            setattr(self, name, 0)
+
+    def as_dict(self):
+        counters = { name: getattr(self, name) for name in NFTRStats.COUNTERS }
+        return {"timings": dict(self.timings), "calls": dict(self.calls), **counters}
+
+    def __str__(self):
+        lines = [ "{:<22} {:10.3f} ms  x{}".format(event, seconds * 1000, self.calls[event])
+                  for event, seconds in self.timings.items() ]
+        lines += [ "{:<22} {}".format(name, getattr(self, name))
+                   for name in NFTRStats.COUNTERS if getattr(self, name) ]
+        return "\n".join(lines)
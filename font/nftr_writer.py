@@ -0,0 +1,295 @@
+import numpy as np
+
+from cmap_index import NO_TILE
+from image_utils import images_to_byte_array
+from nftr import CMAP, NFTR, WIDTH_DTYPE
+
+
+def pad4(size):
+    return (size + 3) // 4 * 4
+
+def cmap_chunk_size(map_type, num_of_entries):
+    """
+        size of a CMAP chunk (with padding), num_of_entries:
+            type 0: unused
+            type 1: number of characters from first to last
+            type 2: number of Char=Tile groups
+    """
+    header_size = CMAP.HEADER["little"].size
+    if map_type == 0:
+        return header_size + 4
+    elif map_type == 1:
+        return pad4(header_size + 2 * num_of_entries)
+    elif map_type == 2:
+        return pad4(header_size + 2 + 4 * num_of_entries)
+
+def build_cmaps(charas, tiles):
+    """
+        split a character -> tile mapping into CMAP chunks, as small as possible:
+        runs of increasing characters with increasing tiles become type 0,
+        dense character ranges become type 1, and the rest goes to one type 2
+
+        (dynamic programming over the runs, the padding of type 1 chunks and
+        the header of the type 2 chunk are not taken into account while
+        choosing, so the result can be a few bytes from the smallest)
+
+        charas, tiles: int arrays of the same length, characters with a
+                       tile < 0 (no tile) are left out
+        return: list of (map_type, first, last, payload)
+            type 0: payload is the tile of first
+            type 1: payload is an uint16 array of tiles from first to last
+            type 2: payload is an (N, 2) uint16 array of (character, tile)
+    """
+    charas = np.asarray(charas, dtype=np.int64)
+    tiles = np.asarray(tiles, dtype=np.int64)
+    assert(len(charas) == len(tiles))
+    mapped = tiles >= 0
+    charas, tiles = charas[mapped], tiles[mapped]
+    order = np.argsort(charas, kind="stable")
+    charas, tiles = charas[order], tiles[order]
+    if len(charas) == 0:
+        return []
+    assert(len(np.unique(charas)) == len(charas))
+    assert(charas[0] >= 0 and charas[-1] < 0x10000)
+
+    # maximal runs of consecutive characters with consecutive tiles
+    run_start = np.flatnonzero(np.concatenate([
+                    [True], (np.diff(charas) != 1) | (np.diff(tiles) != 1)]))
+    run_end = np.concatenate([run_start[1:], [len(charas)]])
+    first = charas[run_start].tolist()
+    last = charas[run_end - 1].tolist()
+    length = (run_end - run_start).tolist()
+
+    type0_size = cmap_chunk_size(0, 0)
+    type1_header_size = CMAP.HEADER["little"].size
+    num_of_runs = len(first)
+
+    # cost[i]: bytes to encode runs [0, i), choice[i]: how run i-1 is encoded
+    cost = [0] * (num_of_runs + 1)
+    choice = [None] * (num_of_runs + 1)
+    # min over j of cost[j] - 2 * first[j], for a type 1 chunk over runs [j, i)
+    best_type1, best_type1_start = None, 0
+    for i in range(num_of_runs):
+        candidate = cost[i] - 2 * first[i]
+        if best_type1 is None or candidate < best_type1:
+            best_type1, best_type1_start = candidate, i
+
+        options = [
+            (cost[i] + 4 * length[i], ("type2", i)),
+            (cost[i] + type0_size, ("type0", i)),
+            (best_type1 + type1_header_size + 2 * (last[i] + 1), ("type1", best_type1_start)),
+        ]
+        cost[i + 1], choice[i + 1] = min(options, key=lambda option: option[0])
+
+    # back track
+    cmaps = []
+    type2_runs = []
+    i = num_of_runs
+    while i > 0:
+        kind, start = choice[i]
+        if kind == "type2":
+            type2_runs.append(start)
+            i -= 1
+        elif kind == "type0":
+            cmaps.append((0, first[start], last[start], int(tiles[run_start[start]])))
+            i -= 1
+        else:
+            lo, hi = run_start[start], run_end[i - 1]
+            table = np.full(last[i - 1] - first[start] + 1, NO_TILE, dtype=np.uint16)
+            table[charas[lo:hi] - first[start]] = tiles[lo:hi]
+            cmaps.append((1, first[start], last[i - 1], table))
+            i = start
+    cmaps.reverse()
+
+    if type2_runs:
+        keep = np.zeros(len(charas), dtype=bool)
+        for run in type2_runs:
+            keep[run_start[run]:run_end[run]] = True
+        pairs = np.stack([charas[keep], tiles[keep]], axis=1).astype(np.uint16)
+        cmaps.append((2, 0x0000, 0xFFFF, pairs))
+
+    return cmaps
+
+def serialize_nftr(tiles, widths, charas, tile_indices,
+                   tile_width, tile_height, bit_depth,
+                   tile_bytes_size=-1,
+                   height=-1, width=-1, width_bis=-1, encoding_id=1,
+                   max_width=-1, underline_location=-1, font_info_underline_location=-1,
+                   max_proportional_width=-1, tile_rotation=0,
+                   version=0x102, byte_order_flag="little",
+                   font_info_chunk_size=0x20,
+                   font_info_unknowns=(0, 0, 0, 0), chara_width_unknown=0,
+                   cmaps=None):
+    """
+        build a whole NFTR file into one preallocated bytearray
+
+        tiles: bytes-like, the packed tiles (tile_bytes_size bytes each),
+               or an (N, tile_height, tile_width) uint8/bool array to be encoded
+        widths: WIDTH_DTYPE array, or (N, 3) array of (left, glyph width, advance)
+        charas, tile_indices: the character -> tile mapping, written as the
+                              smallest CMAPs (see build_cmaps) unless cmaps is given,
+                              a tile index of -1 means no tile
+        -1 values are derived from the tiles and widths
+        return: bytearray
+    """
+    assert(byte_order_flag in ["little", "big"])
+    if tile_bytes_size == -1:
+        tile_bytes_size = (tile_width * tile_height * bit_depth + 7) // 8
+
+    if isinstance(tiles, np.ndarray) and tiles.ndim == 3:
+        tiles = images_to_byte_array(tiles, bit_depth, tile_bytes_size)
+    tiles = memoryview(tiles).cast("B")
+    num_of_tiles = len(tiles) // tile_bytes_size
+    assert(num_of_tiles * tile_bytes_size == len(tiles))
+
+    widths = np.asarray(widths)
+    if widths.dtype != WIDTH_DTYPE:
+        widths = np.ascontiguousarray(widths, dtype=np.uint8).view(WIDTH_DTYPE).reshape(-1)
+    assert(len(widths) == num_of_tiles)
+
+    if height == -1:
+        height = tile_height
+    if width == -1:
+        width = tile_width
+    if width_bis == -1:
+        width_bis = width
+    if max_proportional_width == -1:
+        max_proportional_width = int(widths["advance"].max(initial=0))
+    if max_width == -1:
+        max_width = max_proportional_width
+    if underline_location == -1:
+        underline_location = tile_height - 1
+    if font_info_underline_location == -1:
+        font_info_underline_location = underline_location
+    if cmaps is None:
+        charas = np.asarray(charas, dtype=np.int64)
+        tile_indices = np.asarray(tile_indices, dtype=np.int64)
+        assert(len(charas) == len(tile_indices)), \
+            "{} characters but {} tile indices".format(len(charas), len(tile_indices))
+        mapped = tile_indices[tile_indices >= 0]
+        assert(np.all(mapped < num_of_tiles)), "tile index out of range"
+        cmaps = build_cmaps(charas, tile_indices)
+
+    # chunk offsets
+    header_size = NFTR.HEADER[byte_order_flag].size
+    font_info_offset = header_size
+    glyph_offset = font_info_offset + font_info_chunk_size
+    glyph_chunk_size = pad4(NFTR.CHARACTER_GLYPH[byte_order_flag].size + len(tiles))
+    width_offset = glyph_offset + glyph_chunk_size
+    width_chunk_size = pad4(NFTR.CHARACTER_WIDTH[byte_order_flag].size + 3 * num_of_tiles)
+    cmap_offsets = []
+    offset = width_offset + width_chunk_size
+    for map_type, first, last, payload in cmaps:
+        cmap_offsets.append(offset)
+        offset += cmap_chunk_size(map_type, len(payload) if map_type != 0 else 0)
+    file_size = offset
+
+    buf = bytearray(file_size)
+    bom = b"\xff\xfe" if byte_order_flag == "little" else b"\xfe\xff"
+    uint16 = "<u2" if byte_order_flag == "little" else ">u2"
+
+    # RTFN
+    NFTR.HEADER[byte_order_flag].pack_into(
+        buf, 0, b"RTFN", bom, version, file_size, font_info_offset, 3 + len(cmaps))
+
+    # FINF
+    cmaps_p8 = cmap_offsets[0] + 8 if cmaps else 0
+    NFTR.FONT_INFO[byte_order_flag].pack_into(
+        buf, font_info_offset, b"FNIF", font_info_chunk_size,
+        font_info_unknowns[0], height, font_info_unknowns[1], font_info_unknowns[2],
+        width, width_bis, encoding_id,
+        glyph_offset + 8, width_offset + 8, cmaps_p8)
+    if font_info_chunk_size == 0x20:
+        NFTR.FONT_INFO_EXT[byte_order_flag].pack_into(
+            buf, font_info_offset + NFTR.FONT_INFO[byte_order_flag].size,
+            tile_height, max_width, font_info_underline_location, font_info_unknowns[3])
+
+    # CGLP
+    NFTR.CHARACTER_GLYPH[byte_order_flag].pack_into(
+        buf, glyph_offset, b"PLGC", glyph_chunk_size,
+        tile_width, tile_height, tile_bytes_size,
+        underline_location, max_proportional_width, bit_depth, tile_rotation)
+    start = glyph_offset + NFTR.CHARACTER_GLYPH[byte_order_flag].size
+    buf[start:start + len(tiles)] = tiles
+
+    # CWDH
+    NFTR.CHARACTER_WIDTH[byte_order_flag].pack_into(
+        buf, width_offset, b"HDWC", width_chunk_size,
+        0, num_of_tiles - 1, chara_width_unknown)
+    start = width_offset + NFTR.CHARACTER_WIDTH[byte_order_flag].size
+    buf[start:start + 3 * num_of_tiles] = widths.tobytes()
+
+    # CMAP
+    for i, (map_type, first, last, payload) in enumerate(cmaps):
+        offset = cmap_offsets[i]
+        next_p8 = cmap_offsets[i + 1] + 8 if i + 1 < len(cmaps) else 0
+        size = cmap_chunk_size(map_type, len(payload) if map_type != 0 else 0)
+        CMAP.HEADER[byte_order_flag].pack_into(
+            buf, offset, b"PAMC", size, first, last, map_type, next_p8)
+        offset += CMAP.HEADER[byte_order_flag].size
+
+        if map_type == 0:
+            CMAP.TYPE0[byte_order_flag].pack_into(buf, offset, payload, 0)
+        elif map_type == 1:
+            table = np.asarray(payload).astype(uint16).tobytes()
+            buf[offset:offset + len(table)] = table
+        elif map_type == 2:
+            CMAP.TYPE2[byte_order_flag].pack_into(buf, offset, len(payload))
+            offset += CMAP.TYPE2[byte_order_flag].size
+            pairs = np.asarray(payload).astype(uint16).tobytes()
+            buf[offset:offset + len(pairs)] = pairs
+
+    return buf
+
+def nftr_to_bytes(nftr, images=None, keep_cmaps: bool = False):
+    """
+        serialize a NFTR (e.g. after editing its glyphs or widths)
+        images: (N, H, W) glyphs to encode instead of the original tile bytes
+        keep_cmaps: write the original CMAP chunks instead of rebuilding them
+    """
+    if keep_cmaps:
+        # chara_maps are not remapped by glyph_dedup.dedup_nftr
+        assert(nftr.dedup_report is None or nftr.dedup_report.num_of_duplicates == 0)
+        cmaps = []
+        for cmap in nftr.chara_maps:
+            if cmap.map_type == 0:
+                payload = cmap.tile_num_for_first_chara
+            elif cmap.map_type == 1:
+                payload = cmap.tile_nums
+            else:
+                payload = np.stack([cmap.custom_charas, cmap.custom_tiles], axis=1)
+            cmaps.append((cmap.map_type, cmap.first_character, cmap.last_character, payload))
+        charas, tile_indices = None, None
+    else:
+        cmaps = None
+        charas = nftr.merged_cmaps.characters()
+        tile_indices = nftr.find_character_tiles(charas)
+
+    return serialize_nftr(
+            nftr.chara_glyph_bytes if images is None else images,
+            nftr.chara_widths,
+            charas, tile_indices,
+            nftr.tile_width, nftr.tile_height, nftr.tile_depth,
+            tile_bytes_size=nftr.tile_bytes_size,
+            height=nftr.height, width=nftr.width, width_bis=nftr.width_bis,
+            encoding_id=nftr.encoding_id,
+            max_width=getattr(nftr, "max_width", -1),
+            underline_location=nftr.chara_glyph_underline_location,
+            font_info_underline_location=getattr(nftr, "underline_location", -1),
+            max_proportional_width=nftr.max_proportional_width,
+            tile_rotation=nftr.tile_rotation,
+            version=nftr.version,
+            byte_order_flag=nftr.byte_order_flag,
+            font_info_chunk_size=nftr.font_info_chunk_size,
+            font_info_unknowns=nftr.font_info_unknowns,
+            chara_width_unknown=nftr.chara_width_unknown,
+            cmaps=cmaps,
+        )
+
+def write_nftr(nftr, file_path, images=None, keep_cmaps: bool = False):
+    """
+        write a NFTR to file_path with a single write
+    """
+    buf = nftr_to_bytes(nftr, images, keep_cmaps)
+    with open(file_path, "wb") as fp:
+        fp.write(buf)
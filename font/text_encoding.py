@@ -0,0 +1,138 @@
+from functools import lru_cache
+
+import numpy as np
+
+# FINF encoding byte -> Python codec of the CMAP character codes
+# (NFTR.encoding_id; NFTR.FLAGS.ENC_UTF8 / ENC_UNICODE alias the byte order
+# flags, so the raw byte is used)
+CODECS = {
+    0: "utf-8",   # codes are Unicode codepoints (BMP)
+    1: "utf-16",  # codes are Unicode codepoints (BMP)
+    2: "cp932",   # Shift-JIS, 1 byte codes or (lead << 8 | trail)
+    3: "cp1252",  # 1 byte codes
+}
+UNICODE_CODECS = ["utf-8", "utf-16"]
+
+
+@lru_cache(maxsize=None)
+def native_code_table(codec: str):
+    """
+        lookup table, table[codepoint] is the character code of chr(codepoint)
+        in codec (1 byte: the byte, 2 bytes: first << 8 | second), -1 if it
+        cannot be encoded in 1 or 2 bytes; for every codepoint of the BMP
+    """
+    table = np.full(0x10000, -1, dtype=np.int32)
+    for codepoint in range(0x10000):
+        if 0xD800 <= codepoint <= 0xDFFF:
+            continue
+        try:
+            encoded = chr(codepoint).encode(codec)
+        except UnicodeEncodeError:
+            continue
+        if len(encoded) == 1:
+            table[codepoint] = encoded[0]
+        elif len(encoded) == 2:
+            table[codepoint] = encoded[0] << 8 | encoded[1]
+    table.setflags(write=False)
+    return table
+
+def codepoints_of(text):
+    """
+        str -> uint32 array of its codepoints, one bulk encode
+        (lone surrogates are kept, to be reported as unmappable)
+    """
+    return np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype="<u4").astype(np.uint32)
+
+def to_native_codes(codepoints, codec: str):
+    """
+        codepoints: uint32 array (see codepoints_of)
+        return: int32 array of character codes in codec, -1 if not encodable
+    """
+    codepoints = np.asarray(codepoints, dtype=np.uint32)
+    codes = np.full(codepoints.shape, -1, dtype=np.int32)
+    bmp = (codepoints <= 0xFFFF) & ~((codepoints >= 0xD800) & (codepoints <= 0xDFFF))
+    if codec in UNICODE_CODECS:
+        codes[bmp] = codepoints[bmp]
+    else:
+        codes[bmp] = native_code_table(codec)[codepoints[bmp]]
+    return codes
+
+class EncodedLines:
+    """
+        lines of text converted to the character codes and the tiles of a
+        NFTR, as flat arrays: line i is [offsets[i], offsets[i + 1])
+
+        codepoints: uint32, Unicode codepoints of the lines
+        codes: int32, character codes in the font encoding, -1 if not encodable
+        tiles: int32, tile indices, -1 if the character has no tile
+    """
+    def __init__(self, lines, codec, codepoints, codes, tiles, offsets):
+        self.lines = lines
+        self.codec = codec
+        self.codepoints = codepoints
+        self.codes = codes
+        self.tiles = tiles
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def line_tiles(self, i):
+        return self.tiles[self.offsets[i]:self.offsets[i + 1]]
+
+    def line_codes(self, i):
+        return self.codes[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def mappable(self):
+        """
+            bool array, True for the lines whose characters all have a tile
+        """
+        unmapped = np.concatenate([[0], np.cumsum(self.tiles < 0)])
+        return unmapped[self.offsets[1:]] == unmapped[self.offsets[:-1]]
+
+    def unmappable(self):
+        """
+            return: {line index: [(column, character, reason)]} of the
+                    characters without a tile, reason is "not in <codec>"
+                    or "no glyph"
+        """
+        positions = np.flatnonzero(self.tiles < 0)
+        line_no = np.searchsorted(self.offsets, positions, side="right") - 1
+        report = {}
+        for pos, i in zip(positions.tolist(), line_no.tolist()):
+            column = pos - int(self.offsets[i])
+            reason = "no glyph" if self.codes[pos] >= 0 else "not in {}".format(self.codec)
+            report.setdefault(i, []).append((column, self.lines[i][column], reason))
+        return report
+
+    def report(self):
+        """
+            one line per unmappable character, e.g. for a translation check
+        """
+        return [ "line {}, column {}: {!r} (U+{:04X}) {}".format(i, column, chara, ord(chara), reason)
+                 for i, entries in self.unmappable().items()
+                 for column, chara, reason in entries ]
+
+def encode_lines(nftr, lines, codec=None):
+    """
+        convert every line to the character codes of the NFTR encoding (FINF)
+        and look all of them up at once
+
+        lines: list of str
+        codec: Python codec of the CMAP codes, None for the one of the FINF
+               encoding (NFTR.codec)
+        return: EncodedLines
+    """
+    if codec is None:
+        codec = nftr.codec
+    lengths = np.fromiter((len(line) for line in lines), dtype=np.intp, count=len(lines))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    codepoints = codepoints_of("".join(lines))
+    codes = to_native_codes(codepoints, codec)
+    tiles = np.full(len(codes), -1, dtype=np.int32)
+    encodable = codes >= 0
+    tiles[encodable] = nftr.find_character_tiles(codes[encodable])
+    tiles[tiles >= nftr.num_of_tiles] = -1
+    return EncodedLines(lines, codec, codepoints, codes, tiles, offsets)
@@ -0,0 +1,209 @@
+import numpy as np
+
+from text_encoding import codepoints_of, encode_lines
+
+
+class TextRenderer:
+    """
+        lay out and render strings with the glyphs and widths of a NFTR
+
+        every glyph is drawn at (pen x + Left Spacing) and the pen moves by
+        Total Width (CWDH), lines are wrapped at spaces (or anywhere inside a
+        word too long for the box), '\n' starts a new line
+
+        usage:
+            renderer = TextRenderer(NFTR("font.NFTR"))
+            image = renderer.render("Hello world", box_width=96)
+            too_long = ~renderer.fits(lines, box_width=96, max_lines=2)
+    """
+    def __init__(self, nftr, line_height: int = -1, fallback: str = "?"):
+        """
+            line_height: pixels between lines, -1 for the tile height
+            fallback: drawn for characters not in the NFTR (dropped if it is
+                      not in the NFTR either, or if fallback is "")
+        """
+        self.nftr = nftr
+        self.line_height = nftr.tile_height if line_height == -1 else line_height
+
+        widths = nftr.chara_widths
+        self.left = widths["left"].astype(np.int32)
+        self.glyph_width = widths["glyph_width"].astype(np.int32)
+        self.advance = widths["advance"].astype(np.int32)
+
+        self.fallback_tile = -1
+        if fallback:
+            self.fallback_tile = int(encode_lines(nftr, [fallback[0]]).tiles[0])
+
+    def text_to_tiles(self, text):
+        """
+            return: int32 array of tile indices, -1 for characters not drawn
+                    (characters are converted to the font encoding first)
+        """
+        tiles = encode_lines(self.nftr, [text]).tiles
+        tiles[tiles >= len(self.advance)] = -1
+        tiles[tiles == -1] = self.fallback_tile
+        return tiles
+
+    def advances(self, tiles):
+        return np.where(tiles >= 0, self.advance[tiles], 0)
+
+    def wrap(self, text, box_width: int = -1):
+        """
+            return: [(start, end)] of every line, text[start:end] is the line
+                    (the space a line is broken at is not part of any line)
+        """
+        tiles = self.text_to_tiles(text)
+        cum = np.concatenate([[0], np.cumsum(self.advances(tiles))])
+        charas = codepoints_of(text)
+        spaces = np.flatnonzero(charas == ord(" "))
+        newlines = np.flatnonzero(charas == ord("\n"))
+
+        lines = []
+        start = 0
+        for end in newlines.tolist() + [len(text)]:
+            pos = start
+            while True:
+                if box_width < 0:
+                    limit = end
+                else:
+                    # longest line from pos that fits in the box
+                    limit = int(np.searchsorted(cum, cum[pos] + box_width, side="right")) - 1
+                if limit >= end:
+                    lines.append((pos, end))
+                    break
+                # last space in (pos, limit]
+                i = int(np.searchsorted(spaces, limit, side="right")) - 1
+                if i >= 0 and spaces[i] > pos:
+                    lines.append((pos, int(spaces[i])))
+                    pos = int(spaces[i]) + 1
+                else:
+                    # no space to break at, break inside the word
+                    limit = max(limit, pos + 1)
+                    lines.append((pos, limit))
+                    pos = limit
+            start = end + 1
+        return lines
+
+    def layout(self, text, box_width: int = -1):
+        """
+            return: (tiles, x, line) int32 arrays, one entry per drawn glyph,
+                    x is the left of the tile, line is the line number;
+                    and the number of lines
+        """
+        tiles = self.text_to_tiles(text)
+        cum = np.concatenate([[0], np.cumsum(self.advances(tiles))])
+        lines = np.asarray(self.wrap(text, box_width), dtype=np.intp).reshape(-1, 2)
+
+        # index in text and line number of every character of every line
+        lengths = lines[:, 1] - lines[:, 0]
+        line_no = np.repeat(np.arange(len(lines), dtype=np.int32), lengths)
+        chara_idx = np.arange(lengths.sum()) + np.repeat(lines[:, 0] - np.cumsum(lengths) + lengths, lengths)
+        # pen position from the start of its line
+        pen = cum[chara_idx] - cum[lines[line_no, 0]]
+
+        t = tiles[chara_idx]
+        drawn = t >= 0
+        t = t[drawn]
+        return t, (pen[drawn] + self.left[t]).astype(np.int32), line_no[drawn], len(lines)
+
+    def line_widths(self, text, box_width: int = -1):
+        """
+            return: int32 array, pen advance of every (wrapped) line in pixels
+        """
+        cum = np.concatenate([[0], np.cumsum(self.advances(self.text_to_tiles(text)))])
+        lines = np.asarray(self.wrap(text, box_width), dtype=np.intp).reshape(-1, 2)
+        return (cum[lines[:, 1]] - cum[lines[:, 0]]).astype(np.int32)
+
+    def fits(self, texts, box_width: int, max_lines: int = 1):
+        """
+            return: bool array, True if the text fits in max_lines lines of box_width
+        """
+        return np.asarray([ len(self.wrap(text, box_width)) <= max_lines for text in texts ],
+                          dtype=bool)
+
+    def blit(self, canvas, tiles, x, y, page=None):
+        """
+            draw the glyphs of tiles at (x, y) (top left of the tile) at once,
+            overlapping pixels keep the max
+            canvas: uint8 array, (height, width) or (num_of_pages, height, width)
+            page: for a 3D canvas, the page every glyph is drawn on
+        """
+        if canvas.ndim == 2:
+            pages = canvas[None]
+            page = np.zeros(len(tiles), dtype=np.intp)
+        else:
+            pages = canvas
+        if len(tiles) == 0:
+            return canvas
+
+        uniq, inverse = np.unique(tiles, return_inverse=True)
+        glyphs = self.nftr.get_glyph_images(uniq)[inverse]
+        n, tile_height, tile_width = glyphs.shape
+
+        # flat index into pages of every pixel of every glyph
+        rows = y[:, None, None] + np.arange(tile_height)[None, :, None]
+        cols = x[:, None, None] + np.arange(tile_width)[None, None, :]
+        index = (page[:, None, None] * pages.shape[1] + rows) * pages.shape[2] + cols
+        mask = (glyphs > 0) \
+                & (np.arange(tile_width)[None, None, :] < self.glyph_width[tiles][:, None, None]) \
+                & (rows >= 0) & (rows < pages.shape[1]) \
+                & (cols >= 0) & (cols < pages.shape[2])
+        index = index[mask]
+
+        flat = pages.reshape(-1)
+        if self.overlaps(tiles, x, y, page, tile_height):
+            np.maximum.at(flat, index, glyphs[mask])
+        else:
+            # every pixel is written once (the usual case)
+            flat[index] = glyphs[mask]
+        return canvas
+
+    def overlaps(self, tiles, x, y, page, tile_height):
+        """
+            True if glyphs drawn in blit() may cover the same pixels
+            (glyphs come in drawing order, line by line)
+        """
+        if len(tiles) < 2:
+            return False
+        if self.line_height < tile_height:
+            return True
+        # glyphs in a row (same page and y), the running right edge of the
+        # glyphs before must not go past the left edge of the next one
+        new_row = np.concatenate([[True], (page[1:] != page[:-1]) | (y[1:] != y[:-1])])
+        row = np.cumsum(new_row)
+        shift = row.astype(np.int64) << 32
+        right = np.maximum.accumulate(shift + x + self.glyph_width[tiles])
+        return bool(np.any(~new_row[1:] & (shift[1:] + x[1:] < right[:-1])))
+
+    def render(self, text, box_width: int = -1):
+        """
+            return: uint8 array of shape (num_of_lines * line_height, width),
+                    width is box_width, or the widest line if box_width is -1
+        """
+        return self.render_many([text], box_width)[0]
+
+    def render_many(self, texts, box_width: int = -1):
+        """
+            render a batch of strings into one array
+            return: uint8 array of shape (len(texts), height, width), every text
+                    is drawn from the top left, height fits the longest text
+        """
+        layouts = [ self.layout(text, box_width) for text in texts ]
+
+        if box_width < 0:
+            width = max([ int(self.line_widths(text).max(initial=0)) for text in texts ],
+                        default=0)
+        else:
+            width = box_width
+        height = max([ num_of_lines for _, _, _, num_of_lines in layouts ], default=0) \
+                    * self.line_height
+
+        canvas = np.zeros((len(texts), height, width), dtype=np.uint8)
+        if len(texts) and height and width:
+            tiles = np.concatenate([ t for t, _, _, _ in layouts ])
+            x = np.concatenate([ x for _, x, _, _ in layouts ])
+            y = np.concatenate([ line_no * self.line_height for _, _, line_no, _ in layouts ])
+            page = np.concatenate([ np.full(len(t), i, dtype=np.intp)
+                                    for i, (t, _, _, _) in enumerate(layouts) ])
+            self.blit(canvas, tiles, x, y, page)
+        return canvas